@@ -0,0 +1,113 @@
+#annotation_index.py
+
+class SegmentGrid:
+    # Uniform raster over de lijnstukken van alle annotaties op een pagina. Een hit-test
+    # bekijkt alleen de cellen rond het aangeklikte punt in plaats van elk punt van elke lijn.
+    def __init__(self, cell_size=24.0):
+        self.cell_size = cell_size  # PDF-punten
+        self.cells = {}  # (cx, cy) -> {annotatie: [segment-index, ...]}
+        self.cells_of = {}  # annotatie -> cellen waarin hij voorkomt
+        self.order = {}  # annotatie -> volgnummer; hoger = later getekend = bovenop
+        self.counter = 0
+        # Lijst waaruit het raster nog opgebouwd moet worden; pas bij de eerste hit-test,
+        # zodat een pagina omslaan zonder aanklikken niets kost
+        self.source = None
+
+    def _cell_range(self, min_x, min_y, max_x, max_y):
+        size = self.cell_size
+        for cx in range(int(min_x // size), int(max_x // size) + 1):
+            for cy in range(int(min_y // size), int(max_y // size) + 1):
+                yield cx, cy
+
+    def _segment_cells(self, ax, ay, bx, by):
+        # Cellen die het lijnstuk werkelijk doorkruist (Amanatides-Woo), niet de hele bbox.
+        # De tolerantie zit in hit_test, die alle cellen rond het aangeklikte punt bekijkt.
+        size = self.cell_size
+        cx, cy = int(ax // size), int(ay // size)
+        end_x, end_y = int(bx // size), int(by // size)
+        yield cx, cy
+        dx, dy = bx - ax, by - ay
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # t (0..1 langs het lijnstuk) van de eerstvolgende verticale/horizontale celgrens
+        next_x = ((cx + (step_x > 0)) * size - ax) / dx if dx else float("inf")
+        next_y = ((cy + (step_y > 0)) * size - ay) / dy if dy else float("inf")
+        delta_x = size / abs(dx) if dx else float("inf")
+        delta_y = size / abs(dy) if dy else float("inf")
+        # Precies zoveel stappen als nodig; afronding kan zo nooit voorbij de eindcel lopen
+        for _ in range(abs(end_x - cx) + abs(end_y - cy)):
+            if cy == end_y or (cx != end_x and next_x < next_y):
+                cx += step_x
+                next_x += delta_x
+            else:
+                cy += step_y
+                next_y += delta_y
+            yield cx, cy
+
+    def clear(self):
+        self.cells.clear()
+        self.cells_of.clear()
+        self.order.clear()
+        self.source = None
+
+    def rebuild(self, annotations):
+        # Uitgesteld: de lijst wordt pas bij de eerste hit-test ingelezen
+        self.clear()
+        self.source = annotations
+
+    def _build(self):
+        annotations = self.source
+        self.source = None
+        for ann in annotations:
+            self.add(ann)
+
+    def add(self, ann, order=None):
+        if self.source is not None:
+            return  # komt mee bij het uitgestelde opbouwen
+        if order is None:
+            self.counter += 1
+            order = self.counter
+        self.order[ann] = order
+        coords = ann.coords
+        n = len(coords) // 2
+        cells = set()
+        self.cells_of[ann] = cells
+        if n == 0:
+            return
+        # Eén punt is een lijnstuk van lengte 0
+        for i in range(max(1, n - 1)):
+            ax, ay = coords[2 * i], coords[2 * i + 1]
+            j = min(i + 1, n - 1)
+            bx, by = coords[2 * j], coords[2 * j + 1]
+            for cell in self._segment_cells(ax, ay, bx, by):
+                self.cells.setdefault(cell, {}).setdefault(ann, []).append(i)
+                cells.add(cell)
+
+    def remove(self, ann):
+        if self.source is not None:
+            return None
+        for cell in self.cells_of.pop(ann, ()):
+            entries = self.cells[cell]
+            del entries[ann]
+            if not entries:
+                del self.cells[cell]
+        return self.order.pop(ann, None)
+
+    def update(self, ann):
+        # Na slepen of schalen; de volgorde (wat bovenop ligt) blijft gelijk
+        order = self.remove(ann)
+        self.add(ann, order)
+
+    def hit_test(self, x, y, tolerance=5):
+        # Bovenste annotatie met een lijnstuk binnen tolerance van (x, y), of None
+        if self.source is not None:
+            self._build()
+        candidates = {}
+        for cell in self._cell_range(x - tolerance, y - tolerance, x + tolerance, y + tolerance):
+            for ann, segments in self.cells.get(cell, {}).items():
+                candidates.setdefault(ann, set()).update(segments)
+        for ann in sorted(candidates, key=self.order.get, reverse=True):
+            for i in candidates[ann]:
+                if ann.segment_distance(i, x, y) <= tolerance:
+                    return ann
+        return None
@@ -1,35 +1,293 @@
 #annotation_storage.py
+import hashlib
 import json
 import os
+import threading
+import time
+
+from stroke_codec import to_compact
+
+
+class AnnotationJournal:
+    # Snapshot (het oude annotations.json) plus een append-only logboek met wijzigingen.
+    # Bij compacteren wordt het logboek hernoemd naar .compacting, zodat nieuwe
+    # wijzigingen in een vers logboek terechtkomen terwijl de snapshot geschreven wordt.
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + ".journal"
+        self.compacting_path = snapshot_path + ".journal.compacting"
+        self.entries = 0
+        self.bytes = 0
+
+    def load(self):
+        data = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+        # Een afgebroken compactie laat .compacting achter; die is ouder dan het logboek
+        self._replay(self.compacting_path, data)
+        self.entries, self.bytes = self._replay(self.journal_path, data)
+        # Pagina's in het oude lijstformaat omzetten; bij de volgende compactie compact op schijf
+        return {key: to_compact(value) for key, value in data.items()}
+
+    def _replay(self, path, data):
+        entries = 0
+        size = 0
+        if not os.path.exists(path):
+            return entries, size
+        with open(path, 'r') as f:
+            for line in f:
+                size += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Half geschreven laatste regel na een crash
+                    print(f"Skipping damaged journal line in {path}")
+                    continue
+                data[entry["k"]] = entry["v"]
+                entries += 1
+        return entries, size
+
+    def append(self, changes):
+        lines = "".join(json.dumps({"k": key, "v": value}) + "\n" for key, value in changes.items())
+        with open(self.journal_path, 'a') as f:
+            f.write(lines)
+        self.entries += len(changes)
+        self.bytes += len(lines)
+
+    def start_compaction(self):
+        # Moet onder het slot van de eigenaar gebeuren, samen met het kopiëren van de data.
+        # Is er nog een .compacting van een afgebroken run, dan blijft het logboek staan;
+        # het opnieuw afspelen daarvan over de nieuwe snapshot is onschadelijk.
+        if os.path.exists(self.compacting_path):
+            return
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.compacting_path)
+        self.entries = 0
+        self.bytes = 0
+
+    def finish_compaction(self, data):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+
+class AnnotationShard:
+    # Annotaties van één PDF: eigen snapshot, eigen logboek en eigen compactie
+    COMPACT_ENTRIES = 500
+    COMPACT_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, path):
+        self.journal = AnnotationJournal(path)
+        self.data = {}
+        self.dirty_keys = set()
+        self.compaction_thread = None
+        self.last_used = time.monotonic()
+        try:
+            self.data = self.journal.load()
+        except Exception as e:
+            print(f"Error loading annotations from {path}: {e}")
+
+    def is_idle(self, now, idle_seconds):
+        compacting = self.compaction_thread is not None and self.compaction_thread.is_alive()
+        return not self.dirty_keys and not compacting and now - self.last_used > idle_seconds
+
+    def save(self):
+        # Alleen de gewijzigde pagina's worden aan het logboek toegevoegd
+        if not self.dirty_keys:
+            return
+        changes = {key: self.data.get(key, []) for key in self.dirty_keys}
+        self.dirty_keys.clear()
+        try:
+            self.journal.append(changes)
+        except Exception as e:
+            print(f"Error saving annotations: {e}")
+            self.dirty_keys.update(changes)
+            return
+        if self.journal.entries >= self.COMPACT_ENTRIES or self.journal.bytes >= self.COMPACT_BYTES:
+            self.start_compaction()
+
+    def start_compaction(self):
+        if self.compaction_thread is not None and self.compaction_thread.is_alive():
+            return
+        try:
+            self.journal.start_compaction()
+        except Exception as e:
+            print(f"Error compacting annotations: {e}")
+            return
+        snapshot = dict(self.data)
+        self.compaction_thread = threading.Thread(target=self._compact, args=(snapshot,),
+                                                  name="annotation-compaction")
+        self.compaction_thread.start()
+
+    def _compact(self, snapshot):
+        try:
+            self.journal.finish_compaction(snapshot)
+        except Exception as e:
+            print(f"Error compacting annotations: {e}")
+
 
 class AnnotationStorage:
-    def __init__(self, filename='annotations.json'):
+    # Eén shard per PDF in de map naast annotations.json. Een shard wordt pas
+    # geladen als get()/set() dat document raakt en weer losgelaten als hij een
+    # tijd niet gebruikt is.
+    IDLE_SECONDS = 300
+
+    def __init__(self, filename='annotations.json', identity=None):
         self.filename = filename
-        self.data = {}
+        self.identity = identity  # optionele DocumentIdentity; anders sleutel op pad
+        self.shard_dir = os.path.splitext(filename)[0]
+        self.shards = {}  # document-sleutel -> AnnotationShard
+        self.adopted = set()  # paden waarvan een oude shard al is gecontroleerd
+        self.lock = threading.Lock()
         self.load()
 
     def load(self):
-        if os.path.exists(self.filename):
+        with self.lock:
+            self.shards = {}
             try:
-                with open(self.filename, 'r') as f:
-                    self.data = json.load(f)
+                self._migrate_flat_file()
             except Exception as e:
-                print(f"Error loading annotations: {e}")
-                self.data = {}
-        else:
-            self.data = {}
+                print(f"Error migrating annotations: {e}")
+            self.shards = {}  # niets vasthouden wat niet open is
 
-    def save(self):
+    def _migrate_flat_file(self):
+        # Eenmalig: het oude platte annotations.json (plus logboek) opsplitsen per document
+        legacy = AnnotationJournal(self.filename)
+        if not any(os.path.exists(p) for p in (legacy.snapshot_path, legacy.journal_path, legacy.compacting_path)):
+            return
+        per_document = {}
+        for key, annotations in legacy.load().items():
+            filepath = key.rpartition(":")[0]
+            per_document.setdefault(filepath, {})[key] = annotations
+        os.makedirs(self.shard_dir, exist_ok=True)
+        for filepath, data in per_document.items():
+            shard = self._shard(filepath)
+            shard.data.update(data)
+            shard.journal.finish_compaction(shard.data)
+        for path in (legacy.journal_path, legacy.compacting_path):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(legacy.snapshot_path):
+            os.replace(legacy.snapshot_path, legacy.snapshot_path + ".migrated")
+        print(f"Annotaties opgesplitst in {len(per_document)} documenten in {self.shard_dir}")
+
+    def _shard_path(self, filepath):
+        name = hashlib.sha1(filepath.encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.shard_dir, name + ".json")
+
+    def _doc_key(self, filepath):
+        if self.identity is None:
+            return filepath
+        return self.identity.resolve(filepath)
+
+    def _shard(self, doc, filepath=None):
+        shard = self.shards.get(doc)
+        if shard is None:
+            shard = AnnotationShard(self._shard_path(doc))
+            self.shards[doc] = shard
+        if filepath is not None and filepath != doc and filepath not in self.adopted:
+            self.adopted.add(filepath)
+            self._adopt_path_shard(shard, doc, filepath)
+        shard.last_used = time.monotonic()
+        return shard
+
+    def _adopt_path_shard(self, shard, doc, filepath):
+        # Een shard die nog op het oude pad gesleuteld is eenmalig overnemen
+        legacy = AnnotationJournal(self._shard_path(filepath))
+        paths = (legacy.snapshot_path, legacy.journal_path, legacy.compacting_path)
+        if not any(os.path.exists(p) for p in paths):
+            return
         try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.data, f, indent=4)
+            for key, annotations in legacy.load().items():
+                shard.data.setdefault(f"{doc}:{key.rpartition(':')[2]}", annotations)
+            shard.journal.finish_compaction(shard.data)
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
         except Exception as e:
-            print(f"Error saving annotations: {e}")
+            print(f"Error re-keying annotations for {filepath}: {e}")
+
+    def rekey_paths(self):
+        # Eenmalig bij het opstarten: shards die nog op een bestaand pad staan omzetten,
+        # zodat ze een verhuizing van de map overleven ook als de PDF nog niet geopend is
+        marker = os.path.join(self.shard_dir, ".rekeyed")
+        if self.identity is None or not os.path.isdir(self.shard_dir) or os.path.exists(marker):
+            return
+        for path in self._shard_paths():
+            docs = {key.rpartition(":")[0] for key in AnnotationShard(path).data}
+            for filepath in docs:
+                if os.path.isfile(filepath):
+                    doc = self._doc_key(filepath)
+                    with self.lock:
+                        self._shard(doc, filepath)
+        with self.lock:
+            self.shards = {}
+        try:
+            with open(marker, "w") as f:
+                f.write("1")
+        except OSError as e:
+            print(f"Error writing {marker}: {e}")
+
+    def release_idle(self):
+        now = time.monotonic()
+        for filepath in [fp for fp, shard in self.shards.items() if shard.is_idle(now, self.IDLE_SECONDS)]:
+            del self.shards[filepath]
+
+    def save(self):
+        with self.lock:
+            dirty = [shard for shard in self.shards.values() if shard.dirty_keys]
+            if dirty:
+                os.makedirs(self.shard_dir, exist_ok=True)
+            for shard in dirty:
+                shard.save()
+            self.release_idle()
+
+    def compact(self, wait=False):
+        with self.lock:
+            shards = list(self.shards.values())
+            for shard in shards:
+                shard.start_compaction()
+        if wait:
+            for shard in shards:
+                if shard.compaction_thread is not None:
+                    shard.compaction_thread.join()
+
+    def items(self):
+        # Alle annotaties van alle documenten, bijv. voor een migratie; laadt elke shard kort in
+        if not os.path.isdir(self.shard_dir):
+            return
+        for path in self._shard_paths():
+            yield from AnnotationShard(path).data.items()
+
+    def _shard_paths(self):
+        # Een shard kan (nog) alleen uit een logboek bestaan, zonder snapshot
+        names = set()
+        for name in os.listdir(self.shard_dir):
+            for suffix in (".json", ".json.journal", ".json.journal.compacting"):
+                if name.endswith(suffix):
+                    names.add(name[:-len(suffix)] + ".json")
+        return [os.path.join(self.shard_dir, name) for name in sorted(names)]
 
     def get(self, filepath, page_number):
-        key = f"{filepath}:{page_number}"
-        return self.data.get(key, [])
+        doc = self._doc_key(filepath)
+        key = f"{doc}:{page_number}"
+        with self.lock:
+            data = self._shard(doc, filepath).data.get(key, [])
+            self.release_idle()
+        return data
 
     def set(self, filepath, page_number, annotations):
-        key = f"{filepath}:{page_number}"
-        self.data[key] = annotations
+        doc = self._doc_key(filepath)
+        key = f"{doc}:{page_number}"
+        annotations = to_compact(annotations)
+        with self.lock:
+            shard = self._shard(doc, filepath)
+            # Ongewijzigde pagina's (bijv. na zoomen of draaien) niet opnieuw schrijven
+            if json.dumps(shard.data.get(key, [])) == json.dumps(annotations):
+                return
+            shard.data[key] = annotations
+            shard.dirty_keys.add(key)
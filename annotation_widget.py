@@ -1,44 +1,167 @@
 import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Gdk
+from array import array
+import cairo
 import math
+import time
+
+from stroke_codec import encode_page, decode_page
+from stroke_geometry import point_segment_distance, simplify_stroke, smooth_stroke
+from stroke_path import append_stroke_path, pdf_to_widget_matrix
+from annotation_index import SegmentGrid
+
 
 class Annotation:
+    # Punten in één float32-array; afgeleide geometrie wordt bewaard tot de punten veranderen
+    __slots__ = ("_coords", "color", "pending", "_bbox", "_segments", "_length")
+
     def __init__(self, points, color):
-        self.points = points  # lijst van (x,y) in PDF-coördinaten
+        # Plat float32-array [x0, y0, x1, y1, ...] in PDF-coördinaten; points mag ook een lijst (x,y) zijn
+        if isinstance(points, array):
+            self.coords = points
+        else:
+            self.coords = array("f", [c for p in points for c in p])
         self.color = color    # Gdk.RGBA kleur
+        # Nog niet toegepaste verplaatsing/schaling tijdens slepen of resizen:
+        # (scale_x, scale_y, dx, dy), x' = x * scale_x + dx. Pas bij loslaten in coords verwerkt.
+        self.pending = None
+
+    @property
+    def coords(self):
+        return self._coords
+
+    @coords.setter
+    def coords(self, coords):
+        self._coords = coords
+        self._bbox = None
+        self._segments = None
+        self._length = None
+
+    @property
+    def points(self):
+        it = iter(self.coords)
+        return list(zip(it, it))
+
+    @points.setter
+    def points(self, points):
+        self.coords = array("f", [c for p in points for c in p])
+
+    def _base_bbox(self):
+        if self._bbox is None:
+            xs = self._coords[0::2]
+            ys = self._coords[1::2]
+            self._bbox = (min(xs), min(ys), max(xs), max(ys))
+        return self._bbox
+
+    def segments(self):
+        # (dx, dy, lengte²) per lijnstuk; voor afstandsberekening en lengte
+        if self._segments is None:
+            c = self._coords
+            dxs = array("f", [b - a for a, b in zip(c[0::2], c[2::2])])
+            dys = array("f", [b - a for a, b in zip(c[1::2], c[3::2])])
+            self._segments = (dxs, dys, array("f", [dx * dx + dy * dy for dx, dy in zip(dxs, dys)]))
+        return self._segments
+
+    def length(self):
+        if self._length is None:
+            self._length = sum(math.sqrt(sq) for sq in self.segments()[2])
+        return self._length
+
+    def segment_distance(self, i, x, y):
+        # Afstand van (x, y) tot lijnstuk i, met de bewaarde dx/dy/lengte²
+        c = self._coords
+        ax, ay = c[2 * i], c[2 * i + 1]
+        dxs, dys, lengths_sq = self.segments()
+        if i >= len(lengths_sq) or lengths_sq[i] == 0:
+            return math.hypot(x - ax, y - ay)
+        dx, dy = dxs[i], dys[i]
+        t = max(0.0, min(1.0, ((x - ax) * dx + (y - ay) * dy) / lengths_sq[i]))
+        return math.hypot(x - (ax + t * dx), y - (ay + t * dy))
 
     def get_bounding_box(self):
-        if not self.points:
+        if not self._coords:
             return (0, 0, 0, 0)
-        xs = [p[0] for p in self.points]
-        ys = [p[1] for p in self.points]
-        min_x, max_x = min(xs), max(xs)
-        min_y, max_y = min(ys), max(ys)
+        min_x, min_y, max_x, max_y = self._base_bbox()
+        if self.pending is not None:
+            sx, sy, dx, dy = self.pending
+            min_x, max_x = sorted((min_x * sx + dx, max_x * sx + dx))
+            min_y, max_y = sorted((min_y * sy + dy, max_y * sy + dy))
         return (min_x, min_y, max_x - min_x, max_y - min_y)
 
     def contains_point(self, x, y, tolerance=5):
-        for px, py in self.points:
-            if abs(px - x) <= tolerance and abs(py - y) <= tolerance:
-                return True
-        return False
+        # Afstand tot de lijnstukken, niet alleen tot de punten
+        if not self._coords:
+            return False
+        if self.pending is not None:
+            sx, sy, dx, dy = self.pending
+            c = [v * sx + dx if i % 2 == 0 else v * sy + dy for i, v in enumerate(self._coords)]
+            if len(c) == 2:
+                return point_segment_distance(x, y, c[0], c[1], c[0], c[1]) <= tolerance
+            return any(point_segment_distance(x, y, c[i], c[i + 1], c[i + 2], c[i + 3]) <= tolerance
+                       for i in range(0, len(c) - 2, 2))
+        min_x, min_y, max_x, max_y = self._base_bbox()
+        if not (min_x - tolerance <= x <= max_x + tolerance and min_y - tolerance <= y <= max_y + tolerance):
+            return False
+        return any(self.segment_distance(i, x, y) <= tolerance
+                   for i in range(max(1, len(self._coords) // 2 - 1)))
+
+    def translate(self, dx, dy):
+        sx, sy, tx, ty = self.pending or (1.0, 1.0, 0.0, 0.0)
+        self.pending = (sx, sy, tx + dx, ty + dy)
 
     def scale_non_uniform(self, scale_x, scale_y, anchor=None):
+        # O(1): samengesteld met de openstaande transformatie, niet per punt
         if anchor is None:
             bbox = self.get_bounding_box()
             anchor = (bbox[0], bbox[1])
         ax, ay = anchor
-        self.points = [((x - ax) * scale_x + ax, (y - ay) * scale_y + ay) for (x, y) in self.points]
+        sx, sy, tx, ty = self.pending or (1.0, 1.0, 0.0, 0.0)
+        self.pending = (sx * scale_x, sy * scale_y, (tx - ax) * scale_x + ax, (ty - ay) * scale_y + ay)
+
+    def pending_matrix(self):
+        if self.pending is None:
+            return None
+        sx, sy, dx, dy = self.pending
+        return cairo.Matrix(xx=sx, yy=sy, x0=dx, y0=dy)
+
+    def apply_pending(self):
+        # Eén keer over alle punten, vanuit de originele coördinaten: geen opgestapelde afrondfouten
+        if self.pending is None:
+            return
+        sx, sy, dx, dy = self.pending
+        coords = array("f", self._coords)
+        coords[0::2] = array("f", [x * sx + dx for x in coords[0::2]])
+        coords[1::2] = array("f", [y * sy + dy for y in coords[1::2]])
+        self.coords = coords  # leegt de bewaarde geometrie
+        self.pending = None
 
 class AnnotationWidget(Gtk.DrawingArea):
+    LINE_WIDTH = 2
+    LAYER_MAX_BYTES = 64 * 1024 * 1024  # groter (bijv. bij sterk inzoomen): direct tekenen
+    # Marge rond een nieuw lijnstuk voor queue_draw_area; ruim genoeg voor de miter-punt
+    SEGMENT_PAD = 12
+
     def __init__(self):
         super().__init__()
         self.set_size_request(600, 800)
 
         self.annotations = []
+        self.index = SegmentGrid()  # ruimtelijke index voor hit-tests, gelijk houden met annotations
+        # Vastgelegde annotaties voorgetekend op een offscreen surface; None = opnieuw tekenen
+        self.layer = None
+        self.layer_key = None
+        self.transform_key = None
+        self.transform_cache = None
+
+        # Bewegingen worden verzameld en één keer per frame (frame clock) verwerkt
+        self.motion_samples = []
+        self.tick_id = None
+        self.frame_stats = {"frames": 0, "events": 0, "max_events": 0, "seconds": 0.0, "max_seconds": 0.0}
         self.current_line = []
         self.drawing = False
         self.drawing_enabled = False
+        self.input_enabled = True  # uit zolang de pagina eronder nog niet getoond wordt
         self.wis_modus = False
 
         self.selected_annotation = None
@@ -62,6 +185,11 @@ class AnnotationWidget(Gtk.DrawingArea):
         self.widget_width = 0
         self.widget_height = 0
 
+        # Vereenvoudigen bij loslaten: afwijking hooguit simplify_tolerance PDF-punt, 0 = uit
+        self.simplify_tolerance = 0.5
+        self.smooth_strokes = False
+        self.stroke_stats = {"strokes": 0, "points_in": 0, "points_kept": 0}
+
         self.on_annotation_changed = None
 
         self.connect("draw", self.on_draw)
@@ -72,6 +200,7 @@ class AnnotationWidget(Gtk.DrawingArea):
         self.connect("button-press-event", self.on_button_press)
         self.connect("button-release-event", self.on_button_release)
         self.connect("motion-notify-event", self.on_motion_notify)
+        self.connect("realize", self.on_realize)
 
     def set_line_color(self, rgba: Gdk.RGBA):
         self.current_color = rgba
@@ -98,60 +227,40 @@ class AnnotationWidget(Gtk.DrawingArea):
         self.widget_width = allocation.width
         self.widget_height = allocation.height
 
-    def _mouse_to_pdf_coords(self, mouse_x, mouse_y):
-        if self.pdf_width == 0 or self.pdf_height == 0:
-            return mouse_x, mouse_y
-
-        scale_x = self.pdf_width / self.widget_width if self.widget_width > 0 else 1.0
-        scale_y = self.pdf_height / self.widget_height if self.widget_height > 0 else 1.0
-
-        pdf_x = mouse_x * scale_x
-        pdf_y = mouse_y * scale_y
-
-        pdf_x /= self.current_zoom
-        pdf_y /= self.current_zoom
-
-        center_x = self.pdf_width / (2 * self.current_zoom)
-        center_y = self.pdf_height / (2 * self.current_zoom)
+    def _transforms(self):
+        # (pdf -> widget, widget -> pdf), één keer per zoom/draaiing/afmeting uitgerekend
+        key = (self.current_zoom, self.current_rotation, self.widget_width, self.widget_height,
+               self.pdf_width, self.pdf_height)
+        if self.transform_key != key:
+            to_widget = pdf_to_widget_matrix(*key)
+            to_pdf = cairo.Matrix(*to_widget)
+            to_pdf.invert()
+            self.transform_cache = (to_widget, to_pdf)
+            self.transform_key = key
+        return self.transform_cache
 
-        rel_x = pdf_x - center_x
-        rel_y = pdf_y - center_y
-
-        angle = -math.radians(self.current_rotation)
-        rotated_x = rel_x * math.cos(angle) - rel_y * math.sin(angle)
-        rotated_y = rel_x * math.sin(angle) + rel_y * math.cos(angle)
-
-        return rotated_x + center_x, rotated_y + center_y
+    def _mouse_to_pdf_coords(self, mouse_x, mouse_y):
+        return self._transforms()[1].transform_point(mouse_x, mouse_y)
 
     def _pdf_to_widget_coords(self, pdf_x, pdf_y):
-        if self.pdf_width == 0 or self.pdf_height == 0:
-            return pdf_x, pdf_y
-
-        center_x = self.pdf_width / (2 * self.current_zoom)
-        center_y = self.pdf_height / (2 * self.current_zoom)
-
-        rel_x = pdf_x - center_x
-        rel_y = pdf_y - center_y
-
-        angle = math.radians(self.current_rotation)
-        rotated_x = rel_x * math.cos(angle) - rel_y * math.sin(angle)
-        rotated_y = rel_x * math.sin(angle) + rel_y * math.cos(angle)
+        return self._transforms()[0].transform_point(pdf_x, pdf_y)
 
-        rotated_x += center_x
-        rotated_y += center_y
-
-        zoomed_x = rotated_x * self.current_zoom
-        zoomed_y = rotated_y * self.current_zoom
-
-        scale_x = self.widget_width / self.pdf_width if self.pdf_width > 0 else 1.0
-        scale_y = self.widget_height / self.pdf_height if self.pdf_height > 0 else 1.0
-
-        widget_x = zoomed_x * scale_x
-        widget_y = zoomed_y * scale_y
-
-        return widget_x, widget_y
+    def set_input_enabled(self, enabled):
+        self.input_enabled = enabled
+        if not enabled:
+            # Een half getekende lijn of sleepbeweging hoort bij de vorige pagina
+            self.motion_samples = []
+            self.current_line = []
+            self.drawing = False
+            self.dragging_annotation = False
+            self.drag_start_pdf = None
+            self.resizing_annotation = False
+            self.resize_start_pdf = None
+            self.resize_handle = None
 
     def on_button_press(self, widget, event):
+        if not self.input_enabled:
+            return
         x, y = self._mouse_to_pdf_coords(event.x, event.y)
         if self.resizing_enabled and event.button == 1:
             if self.selected_annotation:
@@ -169,14 +278,15 @@ class AnnotationWidget(Gtk.DrawingArea):
                         self.resize_handle = corner
                         return
         if self.wis_modus and event.button == 1:
-            for ann in reversed(self.annotations):
-                if ann.contains_point(x, y):
-                    self.annotations.remove(ann)
-                    self.selected_annotation = None
-                    self.queue_draw()
-                    if self.on_annotation_changed:
-                        self.on_annotation_changed()
-                    break
+            ann = self.index.hit_test(x, y)
+            if ann is not None:
+                self.annotations.remove(ann)
+                self.index.remove(ann)
+                self.layer = None
+                self.selected_annotation = None
+                self.queue_draw()
+                if self.on_annotation_changed:
+                    self.on_annotation_changed()
         elif self.drawing_enabled and event.button == 1:
             self.drawing = True
             self.current_line = [(x, y)]
@@ -185,28 +295,27 @@ class AnnotationWidget(Gtk.DrawingArea):
         else:
             if event.button == 1:
                 if self.dragging_enabled:
-                    self.selected_annotation = None
-                    for ann in reversed(self.annotations):
-                        if ann.contains_point(x, y):
-                            self.selected_annotation = ann
-                            self.dragging_annotation = True
-                            self.drag_start_pdf = (x, y)
-                            break
+                    self.selected_annotation = self.index.hit_test(x, y)
+                    if self.selected_annotation is not None:
+                        self.dragging_annotation = True
+                        self.drag_start_pdf = (x, y)
                     self.queue_draw()
                 else:
-                    self.selected_annotation = None
-                    for ann in reversed(self.annotations):
-                        if ann.contains_point(x, y):
-                            self.selected_annotation = ann
-                            break
+                    self.selected_annotation = self.index.hit_test(x, y)
                     self.queue_draw()
 
     def on_button_release(self, widget, event):
+        if not self.input_enabled:
+            return
+        if event.button == 1:
+            self._flush_motion()
         if self.drawing_enabled and event.button == 1 and self.drawing:
             self.drawing = False
             if len(self.current_line) > 1:
-                ann = Annotation(self.current_line, self.current_color)
+                ann = Annotation(self._finish_stroke(self.current_line), self.current_color)
                 self.annotations.append(ann)
+                self.index.add(ann)
+                self.layer = None
                 if self.on_annotation_changed:
                     self.on_annotation_changed()
             self.current_line = []
@@ -214,30 +323,120 @@ class AnnotationWidget(Gtk.DrawingArea):
         elif self.dragging_enabled and self.dragging_annotation:
             self.dragging_annotation = False
             self.drag_start_pdf = None
+            if self.selected_annotation is not None:
+                self.selected_annotation.apply_pending()
+                self.index.update(self.selected_annotation)
             if self.on_annotation_changed:
                 self.on_annotation_changed()
         elif self.resizing_enabled and self.resizing_annotation:
             self.resizing_annotation = False
             self.resize_start_pdf = None
             self.resize_handle = None
+            if self.selected_annotation is not None:
+                self.selected_annotation.apply_pending()
+                self.index.update(self.selected_annotation)
             if self.on_annotation_changed:
                 self.on_annotation_changed()
 
+    def _finish_stroke(self, points):
+        coords = array("f", [c for p in points for c in p])
+        tolerance = self.simplify_tolerance
+        if tolerance <= 0:
+            return coords
+        if self.smooth_strokes:
+            # De helft van de marge voor het gladstrijken, de rest voor het vereenvoudigen
+            coords = smooth_stroke(coords, tolerance / 2)
+            tolerance /= 2
+        simplified = simplify_stroke(coords, tolerance)
+        stats = self.stroke_stats
+        stats["strokes"] += 1
+        stats["points_in"] += len(points)
+        stats["points_kept"] += len(simplified) // 2
+        return simplified
+
+    def report_stroke_stats(self):
+        # Bij afsluiten, naast de render-statistieken
+        stats = self.stroke_stats
+        if stats["strokes"]:
+            print(f"Lijnen vereenvoudigd: {stats['strokes']} lijnen, {stats['points_kept']} van "
+                  f"{stats['points_in']} punten behouden")
+
+    def on_realize(self, widget):
+        # Alle samples van stylus/touchscreen doorkrijgen; samenvoegen gebeurt per frame hieronder
+        self.get_window().set_event_compression(False)
+
     def on_motion_notify(self, widget, event):
+        if not self.input_enabled:
+            return
+        if not ((self.drawing_enabled and self.drawing)
+                or (self.dragging_enabled and self.dragging_annotation and self.selected_annotation)
+                or (self.resizing_enabled and self.resizing_annotation and self.selected_annotation)):
+            return
+        self.motion_samples.append((event.x, event.y))
+        if self.tick_id is None:
+            self.tick_id = self.add_tick_callback(self._on_frame_tick)
+
+    def _on_frame_tick(self, widget, frame_clock):
+        self.tick_id = None
+        self._process_motion()
+        return False  # pas bij de volgende beweging weer aanmelden
+
+    def _flush_motion(self):
+        # Bij loslaten: nog openstaande samples verwerken zodat er geen punten verloren gaan
+        if self.tick_id is not None:
+            self.remove_tick_callback(self.tick_id)
+            self.tick_id = None
+        self._process_motion()
+
+    def _process_motion(self):
+        samples = self.motion_samples
+        if not samples:
+            return
+        self.motion_samples = []
+        start = time.perf_counter()
         if self.drawing_enabled and self.drawing:
-            x, y = self._mouse_to_pdf_coords(event.x, event.y)
-            self.current_line.append((x, y))
+            wx, wy = self._pdf_to_widget_coords(*self.current_line[-1])
+            left = right = wx
+            top = bottom = wy
+            for event_x, event_y in samples:
+                self.current_line.append(self._mouse_to_pdf_coords(event_x, event_y))
+                wx, wy = self._pdf_to_widget_coords(*self.current_line[-1])
+                left, right = min(left, wx), max(right, wx)
+                top, bottom = min(top, wy), max(bottom, wy)
+            # Alleen de nieuwe lijnstukken hertekenen; de rest staat al op het scherm
+            pad = self.SEGMENT_PAD
+            self.queue_draw_area(int(left) - pad, int(top) - pad,
+                                 int(right - left) + 2 * pad + 1, int(bottom - top) + 2 * pad + 1)
+        else:
+            for event_x, event_y in samples:
+                self._handle_motion(event_x, event_y)
             self.queue_draw()
-        elif self.dragging_enabled and self.dragging_annotation and self.selected_annotation:
-            x, y = self._mouse_to_pdf_coords(event.x, event.y)
+        elapsed = time.perf_counter() - start
+        stats = self.frame_stats
+        stats["frames"] += 1
+        stats["events"] += len(samples)
+        stats["max_events"] = max(stats["max_events"], len(samples))
+        stats["seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def report_frame_stats(self):
+        # Bij afsluiten, totaal over de hele sessie
+        stats = self.frame_stats
+        if stats["frames"]:
+            print(f"Invoer: {stats['events']} events in {stats['frames']} frames, "
+                  f"gem. {stats['events'] / stats['frames']:.1f} / max {stats['max_events']} per frame, "
+                  f"gem. {stats['seconds'] / stats['frames'] * 1000:.2f} / max {stats['max_seconds'] * 1000:.2f} ms per frame")
+        self.frame_stats = {"frames": 0, "events": 0, "max_events": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+    def _handle_motion(self, event_x, event_y):
+        if self.dragging_enabled and self.dragging_annotation and self.selected_annotation:
+            x, y = self._mouse_to_pdf_coords(event_x, event_y)
             dx = x - self.drag_start_pdf[0]
             dy = y - self.drag_start_pdf[1]
-            moved_points = [(px + dx, py + dy) for (px, py) in self.selected_annotation.points]
-            self.selected_annotation.points = moved_points
+            self.selected_annotation.translate(dx, dy)
             self.drag_start_pdf = (x, y)
-            self.queue_draw()
         elif self.resizing_enabled and self.resizing_annotation and self.selected_annotation:
-            x, y = self._mouse_to_pdf_coords(event.x, event.y)
+            x, y = self._mouse_to_pdf_coords(event_x, event_y)
             start_x, start_y = self.resize_start_pdf
 
             bbox = self.selected_annotation.get_bounding_box()
@@ -282,30 +481,62 @@ class AnnotationWidget(Gtk.DrawingArea):
 
             self.selected_annotation.scale_non_uniform(scale_x_use, scale_y_use, anchor=(anchor_x, anchor_y))
             self.resize_start_pdf = (x, y)
-            self.queue_draw()
 
-    def on_draw(self, widget, cr):
-        cr.set_line_width(2)
-
-        for ann in self.annotations:
+    def _draw_annotations(self, cr, annotations):
+        cr.set_line_width(self.LINE_WIDTH)
+        matrix = self._transforms()[0]
+        for ann in annotations:
             cr.set_source_rgba(ann.color.red, ann.color.green, ann.color.blue, ann.color.alpha)
-            pts = ann.points
-            if len(pts) > 1:
-                wx, wy = self._pdf_to_widget_coords(*pts[0])
-                cr.move_to(wx, wy)
-                for p in pts[1:]:
-                    wx, wy = self._pdf_to_widget_coords(*p)
-                    cr.line_to(wx, wy)
+            if len(ann.coords) > 2:
+                pending = ann.pending_matrix()
+                append_stroke_path(cr, matrix if pending is None else pending.multiply(matrix), ann.coords)
                 cr.stroke()
 
+    def _layer_rect(self):
+        # Deel van de widget dat de laag beslaat; PageCanvas beperkt dit bij tegels tot het beeld
+        return 0, 0, self.widget_width, self.widget_height
+
+    def _get_layer(self, excluded):
+        # Opnieuw opbouwen als annotaties, zoom, draaiing of afmetingen veranderd zijn.
+        # Een annotatie die gesleept of geschaald wordt staat er niet op maar wordt live getekend.
+        # Geeft (surface, x, y), of None als er geen vastgelegde annotaties zijn.
+        annotations = [a for a in self.annotations if a is not excluded]
+        if not annotations:
+            self.layer = None
+            return None
+        x, y, width, height = self._layer_rect()
+        key = (self.current_zoom, self.current_rotation, self.widget_width, self.widget_height,
+               self.pdf_width, self.pdf_height, excluded, (x, y, width, height))
+        if self.layer is not None and self.layer_key == key:
+            return self.layer, x, y
+        window = self.get_window()
+        if window is None or width <= 0 or height <= 0 or width * height * 4 > self.LAYER_MAX_BYTES:
+            self.layer = None
+            return None
+        self.layer = window.create_similar_surface(cairo.CONTENT_COLOR_ALPHA, width, height)
+        cr = cairo.Context(self.layer)
+        cr.translate(-x, -y)
+        self._draw_annotations(cr, annotations)
+        self.layer_key = key
+        return self.layer, x, y
+
+    def on_draw(self, widget, cr):
+        excluded = self.selected_annotation if (self.dragging_annotation or self.resizing_annotation) else None
+        layer = self._get_layer(excluded)
+        if layer is not None:
+            cr.set_source_surface(*layer)
+            cr.paint()
+            if excluded is not None:
+                self._draw_annotations(cr, [excluded])
+        else:
+            self._draw_annotations(cr, self.annotations)
+
+        cr.set_line_width(self.LINE_WIDTH)
+
         if self.drawing and len(self.current_line) > 1:
             cr.set_source_rgba(self.current_color.red, self.current_color.green,
                                self.current_color.blue, self.current_color.alpha)
-            wx, wy = self._pdf_to_widget_coords(*self.current_line[0])
-            cr.move_to(wx, wy)
-            for p in self.current_line[1:]:
-                wx, wy = self._pdf_to_widget_coords(*p)
-                cr.line_to(wx, wy)
+            append_stroke_path(cr, self._transforms()[0], [c for p in self.current_line for c in p])
             cr.stroke()
 
         if self.selected_annotation:
@@ -334,6 +565,8 @@ class AnnotationWidget(Gtk.DrawingArea):
     def clear_selected_annotation(self):
         if self.selected_annotation and self.selected_annotation in self.annotations:
             self.annotations.remove(self.selected_annotation)
+            self.index.remove(self.selected_annotation)
+            self.layer = None
             self.selected_annotation = None
             self.queue_draw()
             if self.on_annotation_changed:
@@ -341,31 +574,22 @@ class AnnotationWidget(Gtk.DrawingArea):
 
     def clear_all_annotations(self):
         self.annotations.clear()
+        self.index.clear()
+        self.layer = None
         self.selected_annotation = None
         self.queue_draw()
         if self.on_annotation_changed:
             self.on_annotation_changed()
 
     def load_annotations(self, annotations_data):
-        from gi.repository import Gdk
+        # Compact formaat uit stroke_codec; oude lijsten met punten worden ook geaccepteerd
         self.annotations.clear()
-        for ann in annotations_data or []:
-            points = ann.get("points", [])
-            color_dict = ann.get("color", {"red": 1, "green": 0, "blue": 0, "alpha": 1})
-            color = Gdk.RGBA(color_dict["red"], color_dict["green"], color_dict["blue"], color_dict["alpha"])
-            self.annotations.append(Annotation(points, color))
+        for coords, (red, green, blue, alpha) in decode_page(annotations_data):
+            self.annotations.append(Annotation(coords, Gdk.RGBA(red, green, blue, alpha)))
+        self.index.rebuild(self.annotations)
+        self.layer = None
         self.queue_draw()
 
     def get_serializable_annotations(self):
-        data = []
-        for ann in self.annotations:
-            data.append({
-                "points": ann.points,
-                "color": {
-                    "red": ann.color.red,
-                    "green": ann.color.green,
-                    "blue": ann.color.blue,
-                    "alpha": ann.color.alpha
-                }
-            })
-        return data
+        return encode_page((ann.coords, (ann.color.red, ann.color.green, ann.color.blue, ann.color.alpha))
+                           for ann in self.annotations)
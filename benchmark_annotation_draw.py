@@ -0,0 +1,105 @@
+#benchmark_annotation_draw.py
+# Micro-benchmark: tekentijd per 10.000 annotatiepunten, per punt omgerekend met
+# math.cos/math.sin (de oude _pdf_to_widget_coords) tegenover één cairo-matrix per lijn.
+#
+#   python benchmark_annotation_draw.py [--points 10000] [--strokes 50] [--repeats 5]
+#
+# Vereist alleen pycairo.
+import argparse
+import json
+import math
+import random
+import time
+from array import array
+
+import cairo
+
+from stroke_path import append_stroke_path, pdf_to_widget_matrix
+
+PDF_SIZE = (595, 842)
+WIDGET_SIZE = (1190, 1684)
+
+
+def per_point_coords(pdf_x, pdf_y, zoom, rotation):
+    # Letterlijk het oude pad: trigonometrie en schaalfactoren voor elk punt opnieuw
+    pdf_width, pdf_height = PDF_SIZE
+    widget_width, widget_height = WIDGET_SIZE
+    center_x = pdf_width / (2 * zoom)
+    center_y = pdf_height / (2 * zoom)
+    rel_x = pdf_x - center_x
+    rel_y = pdf_y - center_y
+    angle = math.radians(rotation)
+    rotated_x = rel_x * math.cos(angle) - rel_y * math.sin(angle) + center_x
+    rotated_y = rel_x * math.sin(angle) + rel_y * math.cos(angle) + center_y
+    return (rotated_x * zoom * widget_width / pdf_width,
+            rotated_y * zoom * widget_height / pdf_height)
+
+
+def draw_per_point(cr, strokes, zoom, rotation):
+    for coords in strokes:
+        cr.move_to(*per_point_coords(coords[0], coords[1], zoom, rotation))
+        it = iter(coords[2:])
+        for px, py in zip(it, it):
+            cr.line_to(*per_point_coords(px, py, zoom, rotation))
+        cr.stroke()
+
+
+def draw_matrix(cr, strokes, zoom, rotation):
+    matrix = pdf_to_widget_matrix(zoom, rotation, *WIDGET_SIZE, *PDF_SIZE)
+    for coords in strokes:
+        append_stroke_path(cr, matrix, coords)
+        cr.stroke()
+
+
+def make_strokes(total_points, stroke_count, seed=1):
+    rnd = random.Random(seed)
+    per_stroke = max(2, total_points // stroke_count)
+    strokes = []
+    for _ in range(stroke_count):
+        x, y = rnd.uniform(40, 550), rnd.uniform(40, 800)
+        coords = array("f")
+        for _ in range(per_stroke):
+            x += rnd.uniform(-2, 2)
+            y += rnd.uniform(-2, 2)
+            coords.extend((x, y))
+        strokes.append(coords)
+    return strokes
+
+
+def measure(draw, strokes, zoom, rotation, repeats):
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, *WIDGET_SIZE)
+    best = float("inf")
+    for _ in range(repeats):
+        cr = cairo.Context(surface)
+        cr.set_line_width(2)
+        start = time.perf_counter()
+        draw(cr, strokes, zoom, rotation)
+        surface.flush()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tekentijd van annotaties per 10k punten")
+    parser.add_argument("--points", type=int, default=10000)
+    parser.add_argument("--strokes", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--zoom", type=float, default=1.0)
+    parser.add_argument("--rotation", type=int, default=90)
+    args = parser.parse_args()
+
+    strokes = make_strokes(args.points, args.strokes)
+    points = sum(len(c) // 2 for c in strokes)
+    per_10k = 10000 / points * 1000
+    before = measure(draw_per_point, strokes, args.zoom, args.rotation, args.repeats)
+    after = measure(draw_matrix, strokes, args.zoom, args.rotation, args.repeats)
+    print(json.dumps({
+        "points": points,
+        "per_point_ms_per_10k": before * per_10k,
+        "matrix_ms_per_10k": after * per_10k,
+        "speedup": before / after if after else 0.0,
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#benchmark_annotations.py
+# Meet opslaggrootte en laadtijd van annotaties in het oude JSON-formaat en in het
+# compacte formaat van stroke_codec. Gebruikt synthetische potloodlijnen, dus geen
+# bestaande annotations.json nodig.
+#
+#   python benchmark_annotations.py [--pages 50] [--strokes 40] [--points 200] [--output bench.json]
+import argparse
+import json
+import math
+import platform
+import random
+import time
+
+from stroke_codec import decode_page, encode_page, _legacy_strokes
+
+COLORS = [(1.0, 0.0, 0.0, 1.0), (0.0, 0.0, 1.0, 1.0), (0.0, 0.6, 0.0, 1.0)]
+
+
+def make_legacy_page(rnd, strokes, points):
+    # Zoals get_serializable_annotations het vroeger opsloeg: floats per muisbeweging
+    page = []
+    for _ in range(strokes):
+        x, y = rnd.uniform(40, 550), rnd.uniform(40, 800)
+        angle = rnd.uniform(0, 2 * math.pi)
+        pts = []
+        for _ in range(points):
+            angle += rnd.uniform(-0.3, 0.3)
+            x += math.cos(angle) * rnd.uniform(0.2, 2.5)
+            y += math.sin(angle) * rnd.uniform(0.2, 2.5)
+            pts.append([x, y])
+        red, green, blue, alpha = rnd.choice(COLORS)
+        page.append({"points": pts, "color": {"red": red, "green": green, "blue": blue, "alpha": alpha}})
+    return page
+
+
+def time_load(texts, decode, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in texts:
+            decode(json.loads(text))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergelijk het oude en het compacte annotatieformaat")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--strokes", type=int, default=40, help="lijnen per pagina")
+    parser.add_argument("--points", type=int, default=200, help="punten per lijn")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None, help="JSON-bestand (standaard: stdout)")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    legacy_pages = [make_legacy_page(rnd, args.strokes, args.points) for _ in range(args.pages)]
+    compact_pages = [encode_page(_legacy_strokes(page)) for page in legacy_pages]
+    legacy_texts = [json.dumps(page, indent=4) for page in legacy_pages]
+    compact_texts = [json.dumps(page, indent=4) for page in compact_pages]
+
+    legacy_bytes = sum(len(t) for t in legacy_texts)
+    compact_bytes = sum(len(t) for t in compact_texts)
+    # Beide naar dezelfde in-memory vorm die Annotation gebruikt
+    legacy_load = time_load(legacy_texts, decode_page, args.repeats)
+    compact_load = time_load(compact_texts, decode_page, args.repeats)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version()},
+        "settings": vars(args),
+        "legacy": {"bytes": legacy_bytes, "load_ms": legacy_load * 1000},
+        "compact": {"bytes": compact_bytes, "load_ms": compact_load * 1000},
+        "size_ratio": legacy_bytes / compact_bytes if compact_bytes else 0.0,
+        "load_speedup": legacy_load / compact_load if compact_load else 0.0,
+    }
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Resultaten geschreven naar {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#benchmark_renderer.py
+# Headless benchmark voor PDFRenderer. Maakt zelf synthetische bladmuziek-PDF's
+# met cairo (geen netwerk of externe bestanden nodig) en schrijft de resultaten
+# als JSON weg, zodat runs en apparaten vergeleken kunnen worden.
+#
+#   python benchmark_renderer.py [--pages 8] [--repeats 3] [--output bench.json]
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import cairo
+
+try:
+    import resource
+except ImportError:  # Windows (msys2)
+    resource = None
+
+from pdf_renderer import PDFRenderer
+
+A4 = (595, 842)
+A3 = (842, 1191)
+
+
+def make_sheet_music_pdf(path, pages, size=A4, seed=1):
+    rnd = random.Random(seed)
+    width, height = size
+    surface = cairo.PDFSurface(path, width, height)
+    cr = cairo.Context(surface)
+    margin = 40
+    staff_gap = 7  # afstand tussen notenbalklijnen
+    system_height = staff_gap * 4 + 60
+    for page in range(pages):
+        cr.set_source_rgb(1, 1, 1)
+        cr.paint()
+        cr.set_source_rgb(0, 0, 0)
+        cr.select_font_face("Serif", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
+        cr.set_font_size(18)
+        cr.move_to(margin, margin)
+        cr.show_text(f"Benchmark stuk - pagina {page + 1}")
+
+        y = margin + 40
+        while y + system_height < height - margin:
+            cr.set_line_width(0.6)
+            for line in range(5):
+                cr.move_to(margin, y + line * staff_gap)
+                cr.line_to(width - margin, y + line * staff_gap)
+            cr.stroke()
+            # maatstrepen
+            measures = 4
+            measure_width = (width - 2 * margin) / measures
+            cr.set_line_width(1)
+            for m in range(measures + 1):
+                x = margin + m * measure_width
+                cr.move_to(x, y)
+                cr.line_to(x, y + 4 * staff_gap)
+            cr.stroke()
+            # noten met stokken
+            x = margin + 12
+            while x < width - margin - 10:
+                pitch = rnd.randint(-3, 11)
+                ny = y + 4 * staff_gap - pitch * staff_gap / 2
+                cr.save()
+                cr.translate(x, ny)
+                cr.scale(1.3, 1.0)
+                cr.arc(0, 0, staff_gap / 2, 0, 2 * math.pi)
+                cr.restore()
+                cr.fill()
+                cr.move_to(x + staff_gap * 0.6, ny)
+                cr.line_to(x + staff_gap * 0.6, ny - staff_gap * 3.5)
+                cr.stroke()
+                x += rnd.choice((10, 14, 18, 24))
+            y += system_height
+        cr.show_page()
+    surface.finish()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux geeft kB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark(pdf_path, zooms, rotations, repeats, use_png_roundtrip, output_surfaces=False):
+    # Zonder render cache, anders meet je alleen cache hits
+    renderer = PDFRenderer(use_png_roundtrip=use_png_roundtrip, cache_bytes=0, output_surfaces=output_surfaces)
+
+    open_times = []
+    for _ in range(repeats):
+        renderer.document_pool.clear()
+        start = time.perf_counter()
+        renderer.open_pdf(pdf_path)
+        open_times.append(time.perf_counter() - start)
+
+    pages = renderer.get_page_count()
+    cases = []
+    total_pages = 0
+    total_time = 0.0
+    for zoom in zooms:
+        for rotation in rotations:
+            latencies = []
+            for _ in range(repeats):
+                for page_number in range(pages):
+                    start = time.perf_counter()
+                    renderer.render_page(page_number, zoom=zoom, rotation=rotation)
+                    latencies.append(time.perf_counter() - start)
+            total_pages += len(latencies)
+            total_time += sum(latencies)
+            cases.append({
+                "zoom": zoom,
+                "rotation": rotation,
+                "renders": len(latencies),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "pages_per_sec": len(latencies) / sum(latencies) if sum(latencies) else 0.0,
+            })
+    return {
+        "open_pdf_ms": {
+            "p50": percentile(open_times, 50) * 1000,
+            "max": max(open_times) * 1000,
+        },
+        "render_page": cases,
+        "pages_per_sec": total_pages / total_time if total_time else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Meet open_pdf- en render_page-prestaties van PDFRenderer")
+    parser.add_argument("--pages", type=int, default=8, help="pagina's per synthetische PDF")
+    parser.add_argument("--repeats", type=int, default=3, help="herhalingen per meting")
+    parser.add_argument("--zooms", default="0.5,1.0,1.5,2.0", help="kommagescheiden zoomniveaus")
+    parser.add_argument("--rotations", default="0,90,180,270", help="kommagescheiden draaiingen")
+    parser.add_argument("--png-roundtrip", action="store_true", help="meet het oude PNG-pad")
+    parser.add_argument("--surfaces", action="store_true", help="cairo-surfaces zoals PageCanvas, geen pixbuf")
+    parser.add_argument("--output", default=None, help="JSON-bestand (standaard: stdout)")
+    args = parser.parse_args()
+
+    zooms = [float(z) for z in args.zooms.split(",")]
+    rotations = [int(r) for r in args.rotations.split(",")]
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "settings": {
+            "pages": args.pages,
+            "repeats": args.repeats,
+            "zooms": zooms,
+            "rotations": rotations,
+            "png_roundtrip": args.png_roundtrip,
+            "surfaces": args.surfaces,
+        },
+        "documents": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, size in (("A4", A4), ("A3", A3)):
+            pdf_path = os.path.join(tmp, f"bench_{name}.pdf")
+            make_sheet_music_pdf(pdf_path, args.pages, size)
+            results["documents"][name] = benchmark(pdf_path, zooms, rotations, args.repeats,
+                                                   args.png_roundtrip, args.surfaces)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Resultaten geschreven naar {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
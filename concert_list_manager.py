@@ -2,6 +2,22 @@
 import json
 import os
 
+
+def get_concert_order(concert_folder):
+    txt_path = os.path.join(concert_folder, "Concert.txt")
+    if not os.path.isfile(txt_path):
+        return []
+    with open(txt_path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+        return [title.strip() for title in content.split(",") if title.strip()]
+
+
+def get_pdf_path_for_piece(concert_folder, stuk_naam):
+    # De PDF's staan in de orkestmap, naast de map "Concert"
+    bovenliggende_map = os.path.dirname(concert_folder)
+    return os.path.join(bovenliggende_map, stuk_naam + ".pdf")
+
+
 class ConcertListManager:
     def __init__(self, storage_file='concert_list.json'):
         self.storage_file = storage_file
@@ -0,0 +1,175 @@
+#disk_cache.py
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+from document_identity import DocumentIdentity
+
+
+class DiskPageCache:
+    MAGIC = b"SMRP"
+    VERSION = 1
+    # magic, versie, kanalen, alpha, breedte, hoogte, rowstride
+    HEADER = struct.Struct("<4sHBBIII")
+    SUFFIX = ".page"
+
+    def __init__(self, directory="page_cache", max_bytes=512 * 1024 * 1024, identity=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Zelfde document-id als annotaties en instellingen; warmup-workers hebben er een in het geheugen
+        self.identity = identity if identity is not None else DocumentIdentity(filename=None)
+        self.lock = threading.Lock()
+        self.total_bytes = None  # pas bij de eerste store uitgerekend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def content_id(self, filepath):
+        return self.identity.resolve_content(filepath)
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + self.SUFFIX)
+
+    def contains(self, key):
+        # Alleen een stat, zonder het bestand te mappen of de hit/miss-tellers te raken
+        return os.path.exists(self._path(key))
+
+    def load(self, key):
+        # Geeft (pixels, breedte, hoogte, rowstride, kanalen, alpha); pixels is een
+        # memoryview op het gemapte bestand, er wordt niets gedecodeerd.
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if len(mm) < self.HEADER.size:
+            mm.close()
+            self.misses += 1
+            return None
+        magic, version, channels, alpha, width, height, rowstride = self.HEADER.unpack_from(mm, 0)
+        if magic != self.MAGIC or version != self.VERSION or len(mm) < self.HEADER.size + rowstride * height:
+            mm.close()
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # recent gebruikt, voor de LRU-opruiming
+        except OSError:
+            pass
+        self.hits += 1
+        pixels = memoryview(mm)[self.HEADER.size:self.HEADER.size + rowstride * height]
+        return pixels, width, height, rowstride, channels, bool(alpha)
+
+    def store(self, key, pixels, width, height, rowstride, channels, alpha):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, channels, int(alpha),
+                                         width, height, rowstride))
+                f.write(pixels)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing page cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += self.HEADER.size + len(pixels)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(self.SUFFIX):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = sorted(self._entries())  # oudste gebruik eerst
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self.total_bytes = total
+
+    def clean(self):
+        removed = 0
+        entries = self._entries()
+        # Halve bestanden van een afgebroken schrijfactie ook opruimen
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".tmp"):
+                    path = os.path.join(self.directory, name)
+                    entries.append((0, os.path.getsize(path), path))
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+                removed += size
+            except OSError:
+                pass
+        self.total_bytes = 0
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Beheer de schijfcache met gerenderde pagina's")
+    parser.add_argument("command", choices=["stats", "clean", "trim"])
+    parser.add_argument("--dir", default="page_cache", help="cachemap (standaard: page_cache)")
+    parser.add_argument("--max-mb", type=float, default=512,
+                        help="maximale grootte in MB, gebruikt door 'trim'")
+    args = parser.parse_args()
+
+    cache = DiskPageCache(args.dir, int(args.max_mb * 1024 * 1024))
+    if args.command == "clean":
+        removed = cache.clean()
+        print(f"{removed / 1048576:.1f} MB verwijderd uit {args.dir}")
+    elif args.command == "trim":
+        cache.evict()
+        print(f"{cache.evictions} pagina's verwijderd, {cache.total_bytes / 1048576:.1f} MB over")
+    else:
+        stats = cache.stats()
+        print(f"{stats['entries']} pagina's, {stats['bytes'] / 1048576:.1f} MB in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#document_identity.py
+import hashlib
+import json
+import os
+import threading
+
+
+class DocumentIdentity:
+    # Identiteit van een PDF op basis van de inhoud in plaats van het pad, zodat
+    # annotaties en instellingen meeverhuizen met een verplaatste of hernoemde map.
+    # Er wordt alleen gehasht als (inode, grootte, mtime) nog niet bekend is.
+    # Wordt een bestand op een bekend pad ter plekke gewijzigd (opnieuw gescand, metadata
+    # herschreven), dan houdt het de document-id van voor de wijziging.
+    SAMPLE_SIZE = 64 * 1024
+
+    def __init__(self, filename='fingerprints.json'):
+        self.filename = filename  # None = alleen in het geheugen (bijv. warmup-workers)
+        self.index = {}  # "inode:grootte:mtime_ns" -> inhoudshash
+        self.aliases = {}  # inhoudshash -> document-id, alleen als die verschillen
+        self.by_path = {}  # pad -> (fingerprint, document-id)
+        self.lock = threading.Lock()
+        self.hashed = 0
+        self.dirty = False
+        # Optionele WriteBehind; zonder writer schrijft de eigenaar zelf met save()
+        self.writer = None
+        self.load()
+
+    def load(self):
+        if self.filename and os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error loading fingerprints: {e}")
+                return
+            if "fingerprints" not in data:
+                self.index = data  # oud formaat: alleen fingerprint -> hash
+                return
+            self.index = data["fingerprints"]
+            self.aliases = data.get("aliases", {})
+            self.by_path = {path: tuple(entry) for path, entry in data.get("paths", {}).items()}
+
+    def save(self):
+        # Buiten de lock wegschrijven, zodat resolve() op het pagina-pad er niet op wacht
+        with self.lock:
+            if not self.filename or not self.dirty:
+                return
+            data = {
+                "fingerprints": dict(self.index),
+                "aliases": dict(self.aliases),
+                "paths": {path: list(entry) for path, entry in self.by_path.items()},
+            }
+            self.dirty = False
+        try:
+            tmp_path = self.filename + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.filename)
+        except Exception as e:
+            print(f"Error saving fingerprints: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def _changed(self):
+        with self.lock:
+            self.dirty = True
+        if self.writer is not None:
+            self.writer.schedule()
+
+    def _content_for(self, filepath, st, fingerprint):
+        # Onder self.lock; (hash, nieuw gehasht)
+        content = self.index.get(fingerprint)
+        if content is not None:
+            return content, False
+        content = self.content_hash(filepath, st.st_size)
+        self.index[fingerprint] = content
+        self.hashed += 1
+        return content, True
+
+    def resolve_content(self, filepath):
+        # Hash van de huidige inhoud, zonder de document-id van een eerdere versie over te nemen.
+        # Voor de schijfcache: een gewijzigde PDF mag geen oude bitmaps opleveren.
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return filepath
+        fingerprint = f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+        with self.lock:
+            content, hashed = self._content_for(filepath, st, fingerprint)
+        if hashed:
+            self._changed()
+        return content
+
+    def resolve(self, filepath):
+        # O(1): één stat plus een dict-lookup; hashen alleen bij een nieuw of gewijzigd bestand
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return filepath  # bestand (nog) niet bereikbaar: terugvallen op het pad
+        fingerprint = f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+        with self.lock:
+            cached = self.by_path.get(filepath)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            # Zelfde pad, onbekende nieuwe inhoud: bijv. opnieuw gescand of metadata herschreven
+            carry_over = cached is not None and fingerprint not in self.index
+            known = set(self.index.values()) if carry_over else ()
+            content, _ = self._content_for(filepath, st, fingerprint)
+            if carry_over and content not in known and content not in self.aliases and content != cached[1]:
+                # Het blijft hetzelfde document, anders raken annotaties en instellingen zoek
+                self.aliases[content] = cached[1]
+            doc_id = self.aliases.get(content, content)
+            if cached is not None and cached[0] != fingerprint and cached[0] in self.index:
+                # De oude vingerafdruk komt niet meer terug, tenzij een ander pad hem nog heeft
+                if all(fp != cached[0] for path, (fp, _) in self.by_path.items() if path != filepath):
+                    del self.index[cached[0]]
+            self.by_path[filepath] = (fingerprint, doc_id)
+        self._changed()
+        return doc_id
+
+    def content_hash(self, filepath, size):
+        # Begin, midden en eind van het bestand plus de grootte; snel ook voor grote scans
+        h = hashlib.sha1(str(size).encode("ascii"))
+        with open(filepath, "rb") as f:
+            for offset in sorted({0, max(0, size // 2 - self.SAMPLE_SIZE // 2), max(0, size - self.SAMPLE_SIZE)}):
+                f.seek(offset)
+                h.update(f.read(self.SAMPLE_SIZE))
+        return h.hexdigest()
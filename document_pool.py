@@ -0,0 +1,57 @@
+#document_pool.py
+from collections import OrderedDict
+import os
+import time
+
+
+class DocumentPool:
+    def __init__(self, loader, max_documents=6):
+        self.loader = loader  # functie: absoluut pad -> Poppler.Document
+        self.max_documents = max_documents
+        self.entries = OrderedDict()  # (pad, mtime) -> (doc, laadtijd in seconden)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+        self.time_saved = 0.0
+
+    def get(self, filepath, record_hit=True):
+        path = os.path.abspath(filepath)
+        key = (path, os.path.getmtime(path))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if record_hit:
+                # Elke hergebruikte handle scheelt opnieuw parsen
+                self.hits += 1
+                self.time_saved += entry[1]
+            return entry[0], key
+
+        self.misses += 1
+        for oud in [k for k in self.entries if k[0] == path]:
+            del self.entries[oud]
+
+        start = time.perf_counter()
+        doc = self.loader(path)
+        duur = time.perf_counter() - start
+        self.load_time += duur
+
+        self.entries[key] = (doc, duur)
+        while len(self.entries) > self.max_documents:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return doc, key
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "open_documents": len(self.entries),
+            "max_documents": self.max_documents,
+            "load_time": self.load_time,
+            "time_saved": self.time_saved,
+        }
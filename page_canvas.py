@@ -0,0 +1,57 @@
+#page_canvas.py
+from annotation_widget import AnnotationWidget
+from tiled_page_view import TileLayer
+
+
+class PageCanvas(AnnotationWidget):
+    # Eén widget voor pagina én annotaties: de gerenderde cairo-surface (of de tegels bij
+    # hoge zoom) en daarboven de annotatielaag, in één draw-pass. Geen GdkPixbuf en geen
+    # tweede pagina-grote laag in een Gtk.Overlay. Cairo beperkt het tekenen tot het
+    # beschadigde gebied, dus scrollen en lijnen tekenen herschilderen alleen dat stuk.
+    def __init__(self, pdf_renderer, hadjustment, vadjustment):
+        super().__init__()
+        self.page_surface = None
+        self.tiles = TileLayer(self, pdf_renderer, hadjustment, vadjustment)
+
+    def set_page_surface(self, surface, size):
+        self.tiles.clear()
+        self.page_surface = surface
+        self._set_page_size(size)
+        self.set_input_enabled(True)
+
+    def set_tiled_page(self, page_number, zoom, rotation, size):
+        self.page_surface = None
+        self.tiles.set_page(page_number, zoom, rotation, size)
+        self._set_page_size(size)
+        self.set_input_enabled(True)
+
+    def clear_page(self):
+        # Leeg tot de volgende pagina er is: geen pagina, geen annotaties en geen pen-invoer.
+        # Bewust zonder on_annotation_changed, de opgeslagen annotaties blijven staan.
+        self.page_surface = None
+        self.tiles.clear()
+        self.set_input_enabled(False)
+        self.annotations.clear()
+        self.index.clear()
+        self.layer = None
+        self.selected_annotation = None
+        self.queue_draw()
+
+    def _layer_rect(self):
+        # Bij tegels kan de pagina vele malen groter zijn dan het scherm; de annotatielaag
+        # volgt dan het beeld, zodat het geheugen niet met de zoom meegroeit
+        if self.tiles.active():
+            return self.tiles.viewport_rect()
+        return super()._layer_rect()
+
+    def _set_page_size(self, size):
+        self.set_size_request(size[0], size[1])
+        self.set_pdf_dimensions(size[0], size[1])  # doet ook queue_draw
+
+    def on_draw(self, widget, cr):
+        if self.page_surface is not None:
+            cr.set_source_surface(self.page_surface, 0, 0)
+            cr.paint()
+        else:
+            self.tiles.paint(cr)
+        return super().on_draw(widget, cr)
@@ -0,0 +1,37 @@
+#page_prefetcher.py
+import threading
+
+
+class PagePrefetcher:
+    def __init__(self, pdf_renderer):
+        self.pdf_renderer = pdf_renderer
+        self.jobs = []  # (filepath, page_number, zoom, rotation), belangrijkste eerst
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="page-prefetch", daemon=True)
+        self.thread.start()
+
+    def schedule(self, jobs):
+        # Een nieuwe paginawissel maakt oudere opdrachten overbodig
+        with self.condition:
+            self.jobs = list(jobs)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.jobs = []
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.jobs:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                filepath, page_number, zoom, rotation = self.jobs.pop(0)
+            try:
+                self.pdf_renderer.prefetch_page(filepath, page_number, zoom, rotation)
+            except Exception as e:
+                print(f"Error prefetching {filepath} page {page_number}: {e}")
@@ -1,11 +1,15 @@
 #page_settings.py
 import json
 import os
+import threading
 
 class PageSettings:
-    def __init__(self, filename='page_settings.json'):
+    def __init__(self, filename='page_settings.json', identity=None):
         self.filename = filename
+        self.identity = identity  # optionele DocumentIdentity; anders sleutel op pad
         self.settings = {}
+        self.dirty = False  # alleen schrijven als er echt iets veranderd is
+        self.lock = threading.RLock()  # save() kan vanaf een achtergrondthread lopen
         self.load()
 
     def load(self):
@@ -20,13 +24,45 @@ class PageSettings:
             self.settings = {}
 
     def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            text = json.dumps(self.settings, indent=4)
+            self.dirty = False
         try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.settings, f, indent=4)
+            tmp_path = self.filename + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, self.filename)
         except Exception as e:
             print(f"Fout bij opslaan instellingen: {e}")
+            with self.lock:
+                self.dirty = True
+
+    def _doc_key(self, filepath):
+        if self.identity is None:
+            return filepath
+        doc_id = self.identity.resolve(filepath)
+        # Instellingen die nog onder het oude pad staan eenmalig overzetten
+        if doc_id != filepath and filepath in self.settings:
+            with self.lock:
+                oud = self.settings.pop(filepath, None)
+                if oud is not None:
+                    self.settings.setdefault(doc_id, {}).update(oud)
+                    self.dirty = True
+        return doc_id
+
+    def rekey_paths(self):
+        # Bij het opstarten: instellingen onder een pad dat nog bestaat meteen omzetten,
+        # zodat ze een verhuizing van de map overleven ook als de PDF nog niet geopend is
+        if self.identity is None:
+            return
+        for key in list(self.settings):
+            if not key.startswith("_app_") and os.path.isfile(key):
+                self._doc_key(key)
 
     def get(self, filepath, page_number):
+        filepath = self._doc_key(filepath)
         # Geef default waardes mét scrollposities terug
         return self.settings.get(filepath, {}).get(str(page_number), {
             "zoom": 1.0,
@@ -36,20 +72,68 @@ class PageSettings:
         })
 
     def set(self, filepath, page_number, zoom, rotation, scroll_x=0, scroll_y=0):
-        if filepath not in self.settings:
-            self.settings[filepath] = {}
-        existing = self.settings[filepath].get(str(page_number), {})
-        existing.update({
+        new = {
             "zoom": zoom,
             "rotation": rotation,
             "scroll_x": scroll_x,
             "scroll_y": scroll_y
-        })
-        self.settings[filepath][str(page_number)] = existing
+        }
+        filepath = self._doc_key(filepath)
+        with self.lock:
+            if filepath not in self.settings:
+                self.settings[filepath] = {}
+            existing = self.settings[filepath].get(str(page_number), {})
+            if all(existing.get(k) == v for k, v in new.items()):
+                return
+            existing = dict(existing)
+            existing.update(new)
+            self.settings[filepath][str(page_number)] = existing
+            self.dirty = True
+
+    def _set_app_setting(self, key, value):
+        with self.lock:
+            if self.settings.get(key) != value:
+                self.settings[key] = value
+                self.dirty = True
 
     # Toegevoegd: persistent opslag basispad van de muziek map
     def get_basispad(self):
         return self.settings.get("_app_basispad_", None)
 
     def set_basispad(self, pad):
-        self.settings["_app_basispad_"] = pad
+        self._set_app_setting("_app_basispad_", pad)
+
+    # Geheugenbudget (MB) voor de cache met gerenderde pagina's, per apparaat instelbaar
+    def get_render_cache_mb(self):
+        return self.settings.get("_app_render_cache_mb_", 64)
+
+    def set_render_cache_mb(self, mb):
+        self._set_app_setting("_app_render_cache_mb_", mb)
+
+    # Aantal geopende PDF-documenten dat bewaard blijft (concertmodus)
+    def get_document_pool_size(self):
+        return self.settings.get("_app_document_pool_size_", 6)
+
+    def set_document_pool_size(self, aantal):
+        self._set_app_setting("_app_document_pool_size_", aantal)
+
+    # Maximale grootte (MB) van de schijfcache met gerenderde pagina's, 0 = uit
+    def get_disk_cache_mb(self):
+        return self.settings.get("_app_disk_cache_mb_", 512)
+
+    def set_disk_cache_mb(self, mb):
+        self._set_app_setting("_app_disk_cache_mb_", mb)
+
+    # Maximale afwijking (PDF-punten) bij het vereenvoudigen van getekende lijnen, 0 = uit
+    def get_stroke_tolerance(self):
+        return self.settings.get("_app_stroke_tolerance_", 0.5)
+
+    def set_stroke_tolerance(self, tolerance):
+        self._set_app_setting("_app_stroke_tolerance_", tolerance)
+
+    # Getekende lijnen licht gladstrijken voor het vereenvoudigen
+    def get_stroke_smoothing(self):
+        return self.settings.get("_app_stroke_smoothing_", False)
+
+    def set_stroke_smoothing(self, enabled):
+        self._set_app_setting("_app_stroke_smoothing_", enabled)
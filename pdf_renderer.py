@@ -2,23 +2,167 @@
 import gi
 gi.require_version("Poppler", "0.18")
 gi.require_version("Gtk", "3.0")
-from gi.repository import Poppler, GdkPixbuf
+from gi.repository import Poppler, GdkPixbuf, GLib
 import cairo
 import io
 import math
+import os
+import sys
+import threading
+
+from render_cache import RenderCache
+from document_pool import DocumentPool
+
+
+def surface_to_rgba_bytes(surface):
+    # Cairo ARGB32 is native-endian premultiplied; the page is painted opaque
+    # first, so only the channel order has to change for GdkPixbuf.
+    surface.flush()
+    w, h = surface.get_width(), surface.get_height()
+    stride = surface.get_stride()
+    src = surface.get_data()
+    if stride != w * 4:
+        src = b"".join(bytes(src[row * stride:row * stride + w * 4]) for row in range(h))
+    buf = bytearray(src)
+    if sys.byteorder == "little":
+        # geheugen: B G R A -> R G B A
+        buf[0::4] = src[2::4]
+        buf[2::4] = src[0::4]
+    else:
+        # geheugen: A R G B -> R G B A
+        buf[0::4] = src[1::4]
+        buf[1::4] = src[2::4]
+        buf[2::4] = src[3::4]
+        buf[3::4] = src[0::4]
+    return buf
+
+
+def surface_to_pixbuf(surface):
+    w, h = surface.get_width(), surface.get_height()
+    data = GLib.Bytes.new(surface_to_rgba_bytes(surface))
+    return GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB,
+                                           True, 8, w, h, w * 4)
+
+
+def pixbuf_from_pixels(pixels, width, height, rowstride, channels, alpha):
+    return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(bytes(pixels)), GdkPixbuf.Colorspace.RGB,
+                                           alpha, 8, width, height, rowstride)
+
+
+def surface_to_pixbuf_png(surface):
+    buf = io.BytesIO()
+    surface.write_to_png(buf)
+    buf.seek(0)
+    loader = GdkPixbuf.PixbufLoader.new_with_type('png')
+    loader.write(buf.read())
+    loader.close()
+    return loader.get_pixbuf()
+
+
+def surface_from_pixels(pixels, width, height, stride):
+    # Eén kopie uit de (gemapte) schijfcache; cairo wil een schrijfbare buffer
+    return cairo.ImageSurface.create_for_data(bytearray(pixels), cairo.FORMAT_ARGB32, width, height, stride)
+
+
+def rotate_surface(source, rotation, w, h):
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+    cr = cairo.Context(surface)
+    apply_page_rotation(cr, rotation, w, h)
+    cr.set_source_surface(source, 0, 0)
+    cr.paint()
+    surface.flush()
+    return surface
+
+
+def scale_surface(source, w, h):
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+    cr = cairo.Context(surface)
+    cr.scale(w / source.get_width(), h / source.get_height())
+    cr.set_source_surface(source, 0, 0)
+    cr.paint()
+    surface.flush()
+    return surface
+
+
+def image_nbytes(image):
+    if isinstance(image, cairo.ImageSurface):
+        return image.get_stride() * image.get_height()
+    return image.get_byte_length()
+
+
+# Draaiing met de klok mee -> GdkPixbuf-rotatie (die telt tegen de klok in)
+CLOCKWISE_ROTATIONS = {
+    90: GdkPixbuf.PixbufRotation.CLOCKWISE,
+    180: GdkPixbuf.PixbufRotation.UPSIDEDOWN,
+    270: GdkPixbuf.PixbufRotation.COUNTERCLOCKWISE,
+}
+
+
+def apply_page_rotation(cr, rotation, w, h):
+    if rotation == 90:
+        cr.translate(w, 0)
+        cr.rotate(math.radians(90))
+    elif rotation == 180:
+        cr.translate(w, h)
+        cr.rotate(math.radians(180))
+    elif rotation == 270:
+        cr.translate(0, h)
+        cr.rotate(math.radians(270))
+
+
+def rotated_page_size(page, zoom, rotation):
+    width, height = page.get_size()
+    width, height = int(width * zoom), int(height * zoom)
+    if rotation in [90, 270]:
+        return height, width
+    return width, height
+
 
 class PDFRenderer:
-    def __init__(self):
+    TILE_SIZE = 256
+    TILED_ZOOM = 2.0  # vanaf deze zoom toont de viewer alleen het zichtbare deel in tegels
+
+    def __init__(self, use_png_roundtrip=None, cache_bytes=64 * 1024 * 1024, max_documents=6,
+                 tile_cache_bytes=32 * 1024 * 1024, disk_cache=None, output_surfaces=False):
         self.doc = None
+        self.doc_key = None
+        self.render_cache = RenderCache(cache_bytes)
+        # Optionele DiskPageCache, overleeft een herstart van de app
+        self.disk_cache = disk_cache
+        self.rotations_derived = 0
+        # Tegels bij hoge zoom; het budget hangt af van de schermgrootte, niet van de zoom
+        self.tile_cache = RenderCache(tile_cache_bytes)
+        # Poppler-documenten zijn niet thread-safe; prefetch en UI delen dit slot
+        self.lock = threading.RLock()
+        # Geopende documenten blijven bewaard voor het wisselen tussen concertstukken
+        self.document_pool = DocumentPool(self._load_document, max_documents)
+        # Oude PNG-omweg blijft beschikbaar om beide paden te kunnen benchmarken
+        if use_png_roundtrip is None:
+            use_png_roundtrip = os.environ.get("SHEETMUSIC_PNG_ROUNDTRIP") == "1"
+        self.use_png_roundtrip = use_png_roundtrip
+        # True: pagina's als cairo.ImageSurface (PageCanvas tekent die direct), anders GdkPixbuf
+        self.output_surfaces = output_surfaces
 
-    def open_pdf(self, filepath):
+    def _load_document(self, filepath):
         from pathlib import Path
         from urllib.request import pathname2url
         from urllib.parse import urljoin
 
         path = Path(filepath).absolute()
         uri = urljoin('file:', pathname2url(str(path)))
-        self.doc = Poppler.Document.new_from_file(uri, None)
+        return Poppler.Document.new_from_file(uri, None)
+
+    def open_pdf(self, filepath):
+        with self.lock:
+            # doc_key is (pad, mtime), zodat een gewijzigde PDF niet uit de cache komt
+            self.doc, self.doc_key = self.document_pool.get(filepath)
+
+    def preload_pdf(self, filepath):
+        # Alleen openen of vasthouden; het echte hergebruik telt pas bij open_pdf
+        with self.lock:
+            if self.doc_key and self.doc_key[0] == os.path.abspath(filepath):
+                return self.doc, self.doc_key
+            return self.document_pool.get(filepath, record_hit=False)
 
     def get_page_count(self):
         if not self.doc:
@@ -26,39 +170,179 @@ class PDFRenderer:
         return self.doc.get_n_pages()
 
     def render_page(self, page_number, zoom=1.0, rotation=0):
-        if not self.doc or page_number < 0 or page_number >= self.get_page_count():
+        with self.lock:
+            return self._render_document_page(self.doc, self.doc_key, page_number, zoom, rotation)
+
+    def _rotation_variants(self, rotation, size):
+        w, h = size
+        for other_rotation in (0, 90, 180, 270):
+            if (other_rotation - rotation) % 180 == 0:
+                yield other_rotation, (w, h)
+            else:
+                yield other_rotation, (h, w)
+
+    def _derive_rotated(self, doc_key, page_number, zoom, rotation, size):
+        # Dezelfde pagina in een andere draaiing en met dezelfde afmetingen kan in het
+        # geheugen gedraaid worden in plaats van opnieuw door Poppler te gaan.
+        for other_rotation, other_size in self._rotation_variants(rotation, size):
+            if other_rotation == rotation:
+                continue
+            source = self.render_cache.peek((doc_key, page_number, round(zoom, 4), other_rotation, other_size))
+            if source is None:
+                continue
+            if (source.get_width(), source.get_height()) != other_size:
+                continue
+            delta = (rotation - other_rotation) % 360
+            self.rotations_derived += 1
+            if self.output_surfaces:
+                return rotate_surface(source, delta, *size)
+            return source.rotate_simple(CLOCKWISE_ROTATIONS[delta])
+        return None
+
+    def get_page_size(self, page_number, zoom=1.0, rotation=0):
+        with self.lock:
+            if not self.doc or page_number < 0 or page_number >= self.doc.get_n_pages():
+                return None
+            return rotated_page_size(self.doc.get_page(page_number), zoom, rotation)
+
+    def tile_key(self, page_number, zoom, rotation, col, row):
+        return (self.doc_key, page_number, round(zoom, 4), rotation, col, row)
+
+    def get_cached_tile(self, page_number, zoom, rotation, col, row):
+        return self.tile_cache.get(self.tile_key(page_number, zoom, rotation, col, row))
+
+    def render_tile(self, page_number, zoom, rotation, col, row):
+        with self.lock:
+            if not self.doc or page_number < 0 or page_number >= self.doc.get_n_pages():
+                return None
+            key = self.tile_key(page_number, zoom, rotation, col, row)
+            tile = self.tile_cache.get(key)
+            if tile is not None:
+                return tile
+
+            page = self.doc.get_page(page_number)
+            w, h = rotated_page_size(page, zoom, rotation)
+            x0, y0 = col * self.TILE_SIZE, row * self.TILE_SIZE
+            tile_w = min(self.TILE_SIZE, w - x0)
+            tile_h = min(self.TILE_SIZE, h - y0)
+            if tile_w <= 0 or tile_h <= 0:
+                return None
+
+            tile = cairo.ImageSurface(cairo.FORMAT_ARGB32, tile_w, tile_h)
+            cr = cairo.Context(tile)
+            cr.set_source_rgb(1, 1, 1)
+            cr.paint()
+            # Alleen het stuk van de pagina onder deze tegel wordt gerasterd
+            cr.translate(-x0, -y0)
+            apply_page_rotation(cr, rotation, w, h)
+            cr.scale(zoom, zoom)
+            page.render(cr)
+            tile.flush()
+            self.tile_cache.put(key, tile, tile.get_stride() * tile_h)
+            return tile
+
+    def render_document_page(self, filepath, page_number, zoom=1.0, rotation=0):
+        # Zoals render_page, maar voor een expliciet document (render-pipeline op een workerthread)
+        with self.lock:
+            doc, doc_key = self.preload_pdf(filepath)
+            return self._render_document_page(doc, doc_key, page_number, zoom, rotation)
+
+    def render_preview(self, filepath, page_number, zoom, rotation, scale):
+        # Lage resolutie opgeschaald naar de volledige afmetingen; None als de scherpe
+        # versie (of een draaiing daarvan) al in het geheugen of op schijf staat. Gaat buiten
+        # render_cache en disk_cache om: een voorvertoning wordt maar één keer getoond.
+        with self.lock:
+            doc, doc_key = self.preload_pdf(filepath)
+            if not doc or page_number < 0 or page_number >= doc.get_n_pages():
+                return None
+            page = doc.get_page(page_number)
+            size = rotated_page_size(page, zoom, rotation)
+            for other_rotation, other_size in self._rotation_variants(rotation, size):
+                if self.render_cache.contains((doc_key, page_number, round(zoom, 4), other_rotation, other_size)):
+                    return None
+            if self.disk_cache is not None and self.disk_cache.contains(
+                    self._disk_key(doc_key, page_number, zoom, rotation, size)):
+                return None
+            w, h = rotated_page_size(page, zoom * scale, rotation)
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+            cr = cairo.Context(surface)
+            cr.set_source_rgb(1, 1, 1)
+            cr.paint()
+            apply_page_rotation(cr, rotation, w, h)
+            cr.scale(zoom * scale, zoom * scale)
+            page.render(cr)
+            surface.flush()
+        if self.output_surfaces:
+            return scale_surface(surface, *size), size
+        return surface_to_pixbuf(surface).scale_simple(size[0], size[1], GdkPixbuf.InterpType.BILINEAR), size
+
+    def prefetch_page(self, filepath, page_number, zoom=1.0, rotation=0):
+        with self.lock:
+            doc, doc_key = self.preload_pdf(filepath)
+            self._render_document_page(doc, doc_key, page_number, zoom, rotation, prefetch=True)
+
+    def _disk_key(self, doc_key, page_number, zoom, rotation, size):
+        disk_key = (self.disk_cache.content_id(doc_key[0]), page_number, round(zoom, 4), rotation, size)
+        if self.output_surfaces:
+            disk_key += ("surface",)  # ARGB32 premultiplied, niet uitwisselbaar met pixbuf-data
+        return disk_key
+
+    def _render_document_page(self, doc, doc_key, page_number, zoom, rotation, prefetch=False):
+        if not doc or page_number < 0 or page_number >= doc.get_n_pages():
             return None
 
-        page = self.doc.get_page(page_number)
-        width, height = page.get_size()
-        width, height = int(width * zoom), int(height * zoom)
+        page = doc.get_page(page_number)
+        w, h = rotated_page_size(page, zoom, rotation)
 
-        if rotation in [90, 270]:
-            w, h = height, width
-        else:
-            w, h = width, height
+        key = (doc_key, page_number, round(zoom, 4), rotation, (w, h))
+        if prefetch and self.render_cache.contains(key):
+            return None
+        image = None if prefetch else self.render_cache.get(key)
+        if image is not None:
+            return image, (w, h)
+
+        image = self._derive_rotated(doc_key, page_number, zoom, rotation, (w, h))
+        if image is not None:
+            self.render_cache.put(key, image, image_nbytes(image))
+            return image, (w, h)
+
+        disk_key = None
+        if self.disk_cache is not None:
+            disk_key = self._disk_key(doc_key, page_number, zoom, rotation, (w, h))
+            cached = self.disk_cache.load(disk_key)
+            if cached is not None:
+                if self.output_surfaces:
+                    image = surface_from_pixels(cached[0], cached[1], cached[2], cached[3])
+                else:
+                    image = pixbuf_from_pixels(*cached)
+                cached[0].release()
+                self.render_cache.put(key, image, image_nbytes(image))
+                return image, (w, h)
 
         surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
         cr = cairo.Context(surface)
 
-        if rotation == 90:
-            cr.translate(w, 0)
-            cr.rotate(math.radians(90))
-        elif rotation == 180:
-            cr.translate(w, h)
-            cr.rotate(math.radians(180))
-        elif rotation == 270:
-            cr.translate(0, h)
-            cr.rotate(math.radians(270))
+        if self.output_surfaces or not self.use_png_roundtrip:
+            # Ondoorzichtige achtergrond, dan is premultiplied alpha gelijk aan gewone alpha
+            cr.set_source_rgb(1, 1, 1)
+            cr.paint()
 
+        apply_page_rotation(cr, rotation, w, h)
         cr.scale(zoom, zoom)
         page.render(cr)
 
-        buf = io.BytesIO()
-        surface.write_to_png(buf)
-        buf.seek(0)
-        loader = GdkPixbuf.PixbufLoader.new_with_type('png')
-        loader.write(buf.read())
-        loader.close()
-        pixbuf = loader.get_pixbuf()
-        return pixbuf, (w, h)
+        if self.output_surfaces:
+            surface.flush()
+            image = surface
+        elif self.use_png_roundtrip:
+            image = surface_to_pixbuf_png(surface)
+        else:
+            image = surface_to_pixbuf(surface)
+        self.render_cache.put(key, image, image_nbytes(image))
+        if disk_key is not None:
+            if self.output_surfaces:
+                self.disk_cache.store(disk_key, surface.get_data(), w, h, surface.get_stride(), 4, True)
+            else:
+                self.disk_cache.store(disk_key, image.read_pixel_bytes().get_data(), w, h,
+                                      image.get_rowstride(), image.get_n_channels(), image.get_has_alpha())
+        return image, (w, h)
@@ -0,0 +1,94 @@
+#render_pipeline.py
+import threading
+
+from gi.repository import GLib
+
+
+class RenderPipeline:
+    # Rendert de pagina die getoond moet worden op een workerthread. Er is steeds maar één
+    # openstaande opdracht: een nieuwe vervangt de vorige, en resultaten van een opdracht
+    # die intussen is ingehaald worden niet meer afgeleverd. Callbacks lopen via
+    # GLib.idle_add op de hoofdthread: callback(generation, image, pdf_size, final);
+    # image is een pixbuf of cairo-surface, afhankelijk van PDFRenderer.output_surfaces.
+    def __init__(self, pdf_renderer):
+        self.pdf_renderer = pdf_renderer
+        self.condition = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.running = True
+        self.requests = 0
+        self.cancelled = 0  # vervangen voordat de worker eraan begon
+        self.superseded = 0  # wel begonnen, resultaat weggegooid
+        self.thread = threading.Thread(target=self._run, name="page-render", daemon=True)
+        self.thread.start()
+
+    def request(self, filepath, page_number, zoom, rotation, callback, preview_scale=None):
+        with self.condition:
+            self.generation += 1
+            self.requests += 1
+            if self.pending is not None:
+                self.cancelled += 1
+            self.pending = (self.generation, filepath, page_number, zoom, rotation, callback, preview_scale)
+            self.condition.notify()
+            return self.generation
+
+    def cancel(self):
+        # Bijv. bij overschakelen naar tegelweergave; geeft de nieuwe generatie terug
+        with self.condition:
+            self.generation += 1
+            if self.pending is not None:
+                self.cancelled += 1
+                self.pending = None
+            return self.generation
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.pending = None
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                job = self.pending
+                self.pending = None
+            try:
+                self._render(*job)
+            except Exception as e:
+                print(f"Error rendering {job[1]} page {job[2]}: {e}")
+
+    def _render(self, generation, filepath, page_number, zoom, rotation, callback, preview_scale):
+        if preview_scale:
+            preview = self.pdf_renderer.render_preview(filepath, page_number, zoom, rotation, preview_scale)
+            if preview is not None:
+                self._deliver(generation, callback, preview[0], preview[1], False)
+        # Poppler kan niet halverwege stoppen; wel tussen voorvertoning en scherpe versie
+        if not self.is_current(generation):
+            self.superseded += 1
+            return
+        res = self.pdf_renderer.render_document_page(filepath, page_number, zoom, rotation)
+        image, pdf_size = res if res else (None, None)
+        self._deliver(generation, callback, image, pdf_size, True)
+
+    def _deliver(self, generation, callback, image, pdf_size, final):
+        def deliver():
+            if self.is_current(generation):
+                callback(generation, image, pdf_size, final)
+            elif final:
+                self.superseded += 1
+            return False
+        GLib.idle_add(deliver)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "cancelled": self.cancelled,
+            "superseded": self.superseded,
+        }
@@ -0,0 +1,230 @@
+#sqlite_storage.py
+import json
+import os
+import sqlite3
+import threading
+
+from annotation_storage import AnnotationStorage
+from page_settings import PageSettings
+from stroke_codec import to_compact
+
+DEFAULT_PAGE_SETTINGS = {
+    "zoom": 1.0,
+    "rotation": 0,
+    "scroll_x": 0,
+    "scroll_y": 0
+}
+
+
+class SQLiteDatabase:
+    def __init__(self, filename='sheet_music.db'):
+        self.filename = filename
+        # Eén verbinding voor UI en achtergrondthreads, beschermd door een slot
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS annotations (
+                    doc TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (doc, page)
+                );
+                CREATE TABLE IF NOT EXISTS page_settings (
+                    doc TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (doc, page)
+                );
+                CREATE TABLE IF NOT EXISTS app_settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+
+    def rekey_document(self, table, old_doc, new_doc):
+        # Rijen die nog op het oude pad staan overzetten naar de inhoudsidentiteit
+        with self.lock, self.conn:
+            self.conn.execute(f"UPDATE OR IGNORE {table} SET doc = ? WHERE doc = ?", (new_doc, old_doc))
+
+    def rekey_paths(self, identity):
+        # Eenmalig bij het opstarten: rijen onder een pad dat nog bestaat omzetten naar de
+        # inhoudsidentiteit, ook als de PDF na de upgrade nog niet geopend is
+        if identity is None or self.get_meta("paths_rekeyed"):
+            return
+        for table in ("annotations", "page_settings"):
+            with self.lock:
+                docs = [row[0] for row in self.conn.execute(f"SELECT DISTINCT doc FROM {table}")]
+            for doc in docs:
+                if os.path.isfile(doc):
+                    doc_id = identity.resolve(doc)
+                    if doc_id != doc:
+                        self.rekey_document(table, doc, doc_id)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('paths_rekeyed', '1')")
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_from_json(self, annotations_file='annotations.json', settings_file='page_settings.json'):
+        # Eenmalig: bestaande JSON-bestanden blijven staan als backup
+        if self.get_meta("json_migrated"):
+            return
+        annotation_rows = []
+        for key, annotations in AnnotationStorage(annotations_file).items():
+            filepath, _, page = key.rpartition(":")
+            try:
+                annotation_rows.append((filepath, int(page), json.dumps(annotations)))
+            except ValueError:
+                print(f"Skipping annotation key during migration: {key}")
+        settings_rows = []
+        app_rows = []
+        if os.path.exists(settings_file):
+            for filepath, pages in PageSettings(settings_file).settings.items():
+                if filepath.startswith("_app_"):
+                    app_rows.append((filepath, json.dumps(pages)))
+                    continue
+                for page, settings in pages.items():
+                    try:
+                        settings_rows.append((filepath, int(page), json.dumps(settings)))
+                    except ValueError:
+                        print(f"Skipping page setting during migration: {filepath}:{page}")
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO annotations (doc, page, data) VALUES (?, ?, ?)",
+                                  annotation_rows)
+            self.conn.executemany("INSERT OR REPLACE INTO page_settings (doc, page, data) VALUES (?, ?, ?)",
+                                  settings_rows)
+            self.conn.executemany("INSERT OR REPLACE INTO app_settings (key, value) VALUES (?, ?)", app_rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+        print(f"Gemigreerd naar {self.filename}: {len(annotation_rows)} pagina's met annotaties, "
+              f"{len(settings_rows)} pagina-instellingen")
+
+
+def resolve_document(db, table, identity, filepath, rekeyed):
+    if identity is None:
+        return filepath
+    doc_id = identity.resolve(filepath)
+    if doc_id != filepath and filepath not in rekeyed:
+        db.rekey_document(table, filepath, doc_id)
+        rekeyed.add(filepath)
+    return doc_id
+
+
+class SQLiteAnnotationStorage:
+    def __init__(self, db, identity=None):
+        self.db = db
+        self.identity = identity
+        self.rekeyed = set()  # paden die deze sessie al naar een document-id zijn omgezet
+        self.pending = {}  # (doc, page) -> annotaties, geschreven bij save()
+
+    def load(self):
+        # Niets vooraf inladen; get() leest per pagina via de index
+        pass
+
+    def save(self):
+        with self.db.lock:
+            if not self.pending:
+                return
+            rows = [(doc, page, json.dumps(annotations)) for (doc, page), annotations in self.pending.items()]
+            try:
+                with self.db.conn:
+                    self.db.conn.executemany(
+                        "INSERT OR REPLACE INTO annotations (doc, page, data) VALUES (?, ?, ?)", rows)
+                self.pending.clear()
+            except sqlite3.Error as e:
+                print(f"Error saving annotations: {e}")
+
+    def get(self, filepath, page_number):
+        key = (resolve_document(self.db, "annotations", self.identity, filepath, self.rekeyed), int(page_number))
+        with self.db.lock:
+            if key in self.pending:
+                return self.pending[key]
+            row = self.db.conn.execute("SELECT data FROM annotations WHERE doc = ? AND page = ?", key).fetchone()
+        return to_compact(json.loads(row[0])) if row else []
+
+    def set(self, filepath, page_number, annotations):
+        annotations = to_compact(annotations)
+        # Ongewijzigde pagina's (bijv. na zoomen of draaien) niet opnieuw schrijven
+        if json.dumps(self.get(filepath, page_number)) == json.dumps(annotations):
+            return
+        doc = resolve_document(self.db, "annotations", self.identity, filepath, self.rekeyed)
+        with self.db.lock:
+            self.pending[(doc, int(page_number))] = annotations
+
+
+class AppSettings(dict):
+    # Onthoudt welke _app_-sleutels gewijzigd zijn sinds de laatste save()
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.dirty = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.dirty.add(key)
+
+
+class SQLitePageSettings(PageSettings):
+    # Zelfde API als PageSettings. self.settings bevat hier alleen de _app_-instellingen,
+    # zodat get_basispad() en de andere app-getters en -setters ongewijzigd blijven werken.
+    def __init__(self, db, identity=None):
+        self.db = db
+        self.rekeyed = set()
+        self.pending = {}  # (doc, page) -> instellingen
+        super().__init__(filename=db.filename, identity=identity)
+
+    def load(self):
+        with self.db.lock:
+            rows = self.db.conn.execute("SELECT key, value FROM app_settings").fetchall()
+        self.settings = AppSettings((key, json.loads(value)) for key, value in rows)
+
+    def save(self):
+        with self.db.lock:
+            rows = [(doc, page, json.dumps(settings)) for (doc, page), settings in self.pending.items()]
+            app_rows = [(key, json.dumps(self.settings[key])) for key in self.settings.dirty]
+            if not rows and not app_rows:
+                return
+            try:
+                with self.db.conn:
+                    self.db.conn.executemany(
+                        "INSERT OR REPLACE INTO page_settings (doc, page, data) VALUES (?, ?, ?)", rows)
+                    self.db.conn.executemany(
+                        "INSERT OR REPLACE INTO app_settings (key, value) VALUES (?, ?)", app_rows)
+                self.pending.clear()
+                self.settings.dirty.clear()
+            except sqlite3.Error as e:
+                print(f"Fout bij opslaan instellingen: {e}")
+
+    def _doc_key(self, filepath):
+        return resolve_document(self.db, "page_settings", self.identity, filepath, self.rekeyed)
+
+    def _load_page(self, filepath, page_number):
+        key = (self._doc_key(filepath), int(page_number))
+        with self.db.lock:
+            if key in self.pending:
+                return self.pending[key]
+            row = self.db.conn.execute("SELECT data FROM page_settings WHERE doc = ? AND page = ?", key).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, filepath, page_number):
+        settings = self._load_page(filepath, page_number)
+        return settings if settings is not None else dict(DEFAULT_PAGE_SETTINGS)
+
+    def set(self, filepath, page_number, zoom, rotation, scroll_x=0, scroll_y=0):
+        new = {
+            "zoom": zoom,
+            "rotation": rotation,
+            "scroll_x": scroll_x,
+            "scroll_y": scroll_y
+        }
+        existing = dict(self._load_page(filepath, page_number) or {})
+        if all(existing.get(k) == v for k, v in new.items()):
+            return
+        existing.update(new)
+        with self.db.lock:
+            self.pending[(self._doc_key(filepath), int(page_number))] = existing
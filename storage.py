@@ -0,0 +1,28 @@
+#storage.py
+import os
+
+from annotation_storage import AnnotationStorage
+from document_identity import DocumentIdentity
+from page_settings import PageSettings
+
+
+def open_storage(engine=None):
+    # "json" (standaard) of "sqlite"; te kiezen met SHEETMUSIC_STORAGE=sqlite
+    # Beide gebruiken dezelfde DocumentIdentity: sleutels op inhoud, niet op pad
+    if engine is None:
+        engine = os.environ.get("SHEETMUSIC_STORAGE", "json")
+    identity = DocumentIdentity()
+    if engine == "sqlite":
+        from sqlite_storage import SQLiteDatabase, SQLiteAnnotationStorage, SQLitePageSettings
+        db = SQLiteDatabase()
+        db.migrate_from_json()
+        db.rekey_paths(identity)
+        identity.save()
+        return SQLitePageSettings(db, identity), SQLiteAnnotationStorage(db, identity)
+    page_settings, annotation_storage = PageSettings(identity=identity), AnnotationStorage(identity=identity)
+    page_settings.rekey_paths()
+    annotation_storage.rekey_paths()
+    # Beide doen niets als er niets veranderd is
+    page_settings.save()
+    identity.save()
+    return page_settings, annotation_storage
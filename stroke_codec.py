@@ -0,0 +1,88 @@
+#stroke_codec.py
+# Compacte opslag van annotatielijnen. Een pagina wordt
+#   {"v": 1, "palette": [[r, g, b, a], ...], "strokes": [[kleur, x0, y0, "h<base64>"], ...]}
+# Coördinaten worden gekwantiseerd op 0,01 PDF-punt; na het eerste punt staan alleen
+# de verschillen (dx, dy) in een int16-array (of int32 als een sprong daar niet in past).
+# Het oude formaat (lijst van {"points": [[x, y], ...], "color": {...}}) wordt bij het
+# laden omgezet.
+import base64
+import sys
+from array import array
+from itertools import accumulate
+
+FORMAT_VERSION = 1
+QUANT = 100  # stappen per PDF-punt
+
+
+def _to_bytes(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_stroke(coords):
+    # coords: plat [x0, y0, x1, y1, ...] in PDF-coördinaten
+    q = [round(c * QUANT) for c in coords]
+    deltas = [b - a for a, b in zip(q, q[2:])]
+    typecode = "h" if all(-32768 <= d <= 32767 for d in deltas) else "i"
+    payload = base64.b64encode(_to_bytes(array(typecode, deltas))).decode("ascii")
+    return q[0], q[1], typecode + payload
+
+
+def decode_stroke(x0, y0, data):
+    deltas = _from_bytes(data[0], base64.b64decode(data[1:]))
+    xs = accumulate(deltas[0::2], initial=x0)
+    ys = accumulate(deltas[1::2], initial=y0)
+    coords = array("f", [0.0]) * (len(deltas) + 2)
+    coords[0::2] = array("f", [x / QUANT for x in xs])
+    coords[1::2] = array("f", [y / QUANT for y in ys])
+    return coords
+
+
+def encode_page(strokes):
+    # strokes: (coords, (r, g, b, a)); een lege pagina blijft [] zoals voorheen
+    palette = []
+    encoded = []
+    for coords, color in strokes:
+        if len(coords) < 2:
+            continue
+        color = [float(c) for c in color]
+        if color not in palette:
+            palette.append(color)
+        encoded.append([palette.index(color), *encode_stroke(coords)])
+    if not encoded:
+        return []
+    return {"v": FORMAT_VERSION, "palette": palette, "strokes": encoded}
+
+
+def decode_page(value):
+    # Geeft [(coords, (r, g, b, a)), ...]; accepteert ook het oude formaat
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [(coords, color) for coords, color in _legacy_strokes(value)]
+    palette = [tuple(color) for color in value["palette"]]
+    return [(decode_stroke(x0, y0, data), palette[color]) for color, x0, y0, data in value["strokes"]]
+
+
+def to_compact(value):
+    # Oud formaat omzetten; al compacte pagina's ongewijzigd teruggeven
+    if isinstance(value, list) and value:
+        return encode_page(_legacy_strokes(value))
+    return value
+
+
+def _legacy_strokes(value):
+    for ann in value:
+        coords = array("f", [c for point in ann.get("points", []) for c in point[:2]])
+        color = ann.get("color", {"red": 1, "green": 0, "blue": 0, "alpha": 1})
+        yield coords, (color["red"], color["green"], color["blue"], color["alpha"])
@@ -0,0 +1,61 @@
+#stroke_geometry.py
+# Geometrie op platte coördinaat-arrays [x0, y0, x1, y1, ...] in PDF-coördinaten
+import math
+from array import array
+
+
+def point_segment_distance(px, py, ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify_stroke(coords, tolerance):
+    # Ramer-Douglas-Peucker: elk weggelaten punt ligt binnen tolerance van de nieuwe lijn.
+    # Iteratief met een stapel, zodat lange lijnen de recursielimiet niet raken.
+    n = len(coords) // 2
+    if n < 3 or tolerance <= 0:
+        return array("f", coords)
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = coords[2 * first], coords[2 * first + 1]
+        bx, by = coords[2 * last], coords[2 * last + 1]
+        max_dist = -1.0
+        index = first
+        for i in range(first + 1, last):
+            d = point_segment_distance(coords[2 * i], coords[2 * i + 1], ax, ay, bx, by)
+            if d > max_dist:
+                max_dist = d
+                index = i
+        if max_dist > tolerance:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+    return array("f", [c for i in range(n) if keep[i] for c in (coords[2 * i], coords[2 * i + 1])])
+
+
+def smooth_stroke(coords, max_shift):
+    # Gewogen gemiddelde (1-2-1) van de buren; een punt schuift hooguit max_shift op,
+    # begin- en eindpunt blijven staan
+    n = len(coords) // 2
+    if n < 3 or max_shift <= 0:
+        return array("f", coords)
+    result = array("f", coords)
+    for i in range(1, n - 1):
+        x, y = coords[2 * i], coords[2 * i + 1]
+        sx = (coords[2 * i - 2] + 2 * x + coords[2 * i + 2]) / 4
+        sy = (coords[2 * i - 1] + 2 * y + coords[2 * i + 3]) / 4
+        shift = math.hypot(sx - x, sy - y)
+        if shift > max_shift:
+            sx = x + (sx - x) * max_shift / shift
+            sy = y + (sy - y) * max_shift / shift
+        result[2 * i] = sx
+        result[2 * i + 1] = sy
+    return result
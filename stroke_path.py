@@ -0,0 +1,30 @@
+#stroke_path.py
+# Annotatielijnen tekenen met cairo, zonder Gtk: ook bruikbaar in benchmarks en tests
+import math
+
+import cairo
+
+
+def pdf_to_widget_matrix(zoom, rotation, widget_width, widget_height, pdf_width, pdf_height):
+    # Draaien om het midden van de pagina, dan zoomen en schalen naar de widget
+    if pdf_width == 0 or pdf_height == 0:
+        return cairo.Matrix()
+    center_x = pdf_width / (2 * zoom)
+    center_y = pdf_height / (2 * zoom)
+    scale_x = widget_width / pdf_width if widget_width > 0 else 1.0
+    scale_y = widget_height / pdf_height if widget_height > 0 else 1.0
+    matrix = cairo.Matrix(x0=-center_x, y0=-center_y)
+    matrix = matrix.multiply(cairo.Matrix.init_rotate(math.radians(rotation)))
+    matrix = matrix.multiply(cairo.Matrix(x0=center_x, y0=center_y))
+    return matrix.multiply(cairo.Matrix(xx=zoom * scale_x, yy=zoom * scale_y))
+
+
+def append_stroke_path(cr, matrix, coords):
+    # Punten in PDF-coördinaten; cairo past de matrix toe, de lijndikte blijft in pixels
+    cr.save()
+    cr.transform(matrix)
+    cr.move_to(coords[0], coords[1])
+    it = iter(coords[2:])
+    for px, py in zip(it, it):
+        cr.line_to(px, py)
+    cr.restore()
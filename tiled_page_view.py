@@ -0,0 +1,123 @@
+#tiled_page_view.py
+from gi.repository import GLib
+import math
+
+
+class TileLayer:
+    # Tegels van een pagina bij hoge zoom. Tekent zelf niet als widget maar in de
+    # draw-callback van de widget die hem gebruikt (PageCanvas), en vraagt daar
+    # ook het hertekenen van nieuw klaargezette tegels aan.
+    MARGIN_TILES = 1  # extra rand tegels rond het zichtbare deel
+
+    def __init__(self, widget, pdf_renderer, hadjustment, vadjustment):
+        self.widget = widget
+        self.pdf_renderer = pdf_renderer
+        self.hadjustment = hadjustment
+        self.vadjustment = vadjustment
+
+        self.page_number = None
+        self.zoom = 1.0
+        self.rotation = 0
+        self.page_width = 0
+        self.page_height = 0
+
+        self.pending_tiles = []
+        self.idle_id = None
+
+        for adjustment in (hadjustment, vadjustment):
+            adjustment.connect("value-changed", self.on_viewport_changed)
+            adjustment.connect("changed", self.on_viewport_changed)
+
+    def set_page(self, page_number, zoom, rotation, size):
+        self.page_number = page_number
+        self.zoom = zoom
+        self.rotation = rotation
+        self.page_width, self.page_height = size
+        self.schedule_margin_tiles()
+
+    def clear(self):
+        self.page_number = None
+        self.pending_tiles = []
+        if self.idle_id is not None:
+            GLib.source_remove(self.idle_id)
+            self.idle_id = None
+
+    def active(self):
+        return self.page_number is not None
+
+    def viewport_rect(self):
+        # Zichtbaar deel plus MARGIN_TILES, uitgelijnd op tegelgrenzen zodat kleine
+        # scrollbewegingen dezelfde rechthoek geven; (x, y, breedte, hoogte) in pixels
+        ts = self.pdf_renderer.TILE_SIZE
+        margin = self.MARGIN_TILES * ts
+        x = self.hadjustment.get_value()
+        y = self.vadjustment.get_value()
+        x1 = max(0, int((x - margin) // ts) * ts)
+        y1 = max(0, int((y - margin) // ts) * ts)
+        x2 = min(self.page_width, int(math.ceil((x + self.hadjustment.get_page_size() + margin) / ts)) * ts)
+        y2 = min(self.page_height, int(math.ceil((y + self.vadjustment.get_page_size() + margin) / ts)) * ts)
+        return x1, y1, max(0, x2 - x1), max(0, y2 - y1)
+
+    def _tiles_in_rect(self, x1, y1, x2, y2):
+        ts = self.pdf_renderer.TILE_SIZE
+        max_col = math.ceil(self.page_width / ts)
+        max_row = math.ceil(self.page_height / ts)
+        cols = range(max(0, int(x1 // ts)), min(max_col, int(math.ceil(x2 / ts))))
+        rows = range(max(0, int(y1 // ts)), min(max_row, int(math.ceil(y2 / ts))))
+        return [(col, row) for row in rows for col in cols]
+
+    def paint(self, cr):
+        if self.page_number is None:
+            return
+        ts = self.pdf_renderer.TILE_SIZE
+        # Alleen tegels uit de cache; ontbrekende worden wit en gaan vooraan in de rij
+        # voor _render_next_tile, zodat draw nooit op Poppler wacht
+        missing = []
+        for col, row in self._tiles_in_rect(*cr.clip_extents()):
+            tile = self.pdf_renderer.get_cached_tile(self.page_number, self.zoom, self.rotation, col, row)
+            if tile is not None:
+                cr.set_source_surface(tile, col * ts, row * ts)
+                cr.paint()
+            else:
+                missing.append((col, row))
+                cr.rectangle(col * ts, row * ts,
+                             min(ts, self.page_width - col * ts), min(ts, self.page_height - row * ts))
+                cr.set_source_rgb(1, 1, 1)
+                cr.fill()
+        if missing:
+            self.pending_tiles = missing + [t for t in self.pending_tiles if t not in missing]
+            if self.idle_id is None:
+                self.idle_id = GLib.idle_add(self._render_next_tile, priority=GLib.PRIORITY_LOW)
+
+    def on_viewport_changed(self, adjustment):
+        if self.page_number is not None:
+            self.schedule_margin_tiles()
+
+    def schedule_margin_tiles(self):
+        ts = self.pdf_renderer.TILE_SIZE
+        margin = self.MARGIN_TILES * ts
+        x = self.hadjustment.get_value()
+        y = self.vadjustment.get_value()
+        x2 = x + self.hadjustment.get_page_size()
+        y2 = y + self.vadjustment.get_page_size()
+        tiles = self._tiles_in_rect(x - margin, y - margin, x2 + margin, y2 + margin)
+        self.pending_tiles = [
+            (col, row) for col, row in tiles
+            if not self.pdf_renderer.tile_cache.contains(
+                self.pdf_renderer.tile_key(self.page_number, self.zoom, self.rotation, col, row))
+        ]
+        if self.pending_tiles and self.idle_id is None:
+            self.idle_id = GLib.idle_add(self._render_next_tile, priority=GLib.PRIORITY_LOW)
+
+    def _render_next_tile(self):
+        if self.page_number is None or not self.pending_tiles:
+            self.idle_id = None
+            return False
+        col, row = self.pending_tiles.pop(0)
+        self.pdf_renderer.render_tile(self.page_number, self.zoom, self.rotation, col, row)
+        ts = self.pdf_renderer.TILE_SIZE
+        self.widget.queue_draw_area(col * ts, row * ts, ts, ts)
+        if not self.pending_tiles:
+            self.idle_id = None
+            return False
+        return True
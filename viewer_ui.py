@@ -4,14 +4,21 @@ from gi.repository import Gtk, Gdk, GLib
 import os
 
 from pdf_renderer import PDFRenderer
+from disk_cache import DiskPageCache
+from page_prefetcher import PagePrefetcher
+from render_pipeline import RenderPipeline
+from page_canvas import PageCanvas
+from tiled_page_view import TileLayer
 from page_navigator import PageNavigator
-from annotation_widget import AnnotationWidget
-from annotation_storage import AnnotationStorage
-from page_settings import PageSettings
+from storage import open_storage
+from write_behind import WriteBehind
 from file_selector import open_pdf_filechooser
+from concert_list_manager import get_concert_order, get_pdf_path_for_piece
 
 class PDFViewerUI(Gtk.Window):
     LONGPRESS_TIME = 1000
+    TILED_ZOOM = PDFRenderer.TILED_ZOOM
+    PREVIEW_SCALE = 0.25  # resolutie van de snelle voorvertoning bij progressief renderen
 
     def __init__(self):
         super().__init__(title="PDF Viewer")
@@ -24,12 +31,33 @@ class PDFViewerUI(Gtk.Window):
         self.set_default_size(screen_width, screen_height)
         self.fullscreen()
 
-        self.pdf_renderer = PDFRenderer()
+        self.page_settings, self.annotation_storage = open_storage()
+        self.settings_writer = WriteBehind(self.page_settings, name="page-settings-writer")
+        self.annotation_writer = WriteBehind(self.annotation_storage, name="annotation-writer")
+        # Vingerafdrukken van nieuw gehashte PDF's; resolve() plant alleen een schrijfactie in
+        self.identity = self.page_settings.identity
+        self.fingerprint_writer = WriteBehind(self.identity, name="fingerprint-writer")
+        self.identity.writer = self.fingerprint_writer
+        disk_cache_mb = self.page_settings.get_disk_cache_mb()
+        disk_cache = DiskPageCache(max_bytes=int(disk_cache_mb * 1024 * 1024),
+                                   identity=self.identity) if disk_cache_mb > 0 else None
+        self.pdf_renderer = PDFRenderer(
+            cache_bytes=int(self.page_settings.get_render_cache_mb() * 1024 * 1024),
+            max_documents=self.page_settings.get_document_pool_size(),
+            tile_cache_bytes=self._tile_cache_budget(screen_width, screen_height),
+            disk_cache=disk_cache,
+            output_surfaces=True)
+        self.page_prefetcher = PagePrefetcher(self.pdf_renderer)
+        self.render_pipeline = RenderPipeline(self.pdf_renderer)
         self.page_navigator = PageNavigator()
-        self.page_settings = PageSettings()
-        self.annotation_storage = AnnotationStorage()
 
         self.filepath = None
+        self.progressive_rendering = True
+        # (x, y) voor de pagina die nog gerenderd wordt; tot _restore_scroll geweest is horen
+        # de scrollbalken nog bij de vorige pagina
+        self.pending_scroll = None
+        self.rendering_page = 0
+        self.page_loading = False  # nieuwe pagina aangevraagd, surface en annotaties nog niet gezet
         self.current_zoom = 1.0
         self.current_rotation = 0
 
@@ -96,25 +124,29 @@ class PDFViewerUI(Gtk.Window):
         self.scrolled_window.set_vexpand(True)
         self.main_overlay.add(self.scrolled_window)
 
-        self.overlay = Gtk.Overlay()
-        self.scrolled_window.add(self.overlay)
+        # Alleen voor de tik-zones; de pagina en de annotaties tekent PageCanvas in één keer
+        self.page_container = Gtk.EventBox()
+        self.scrolled_window.add(self.page_container)
 
-        self.image = Gtk.Image()
-        self.overlay.add(self.image)
+        self.page_canvas = PageCanvas(self.pdf_renderer,
+                                      self.scrolled_window.get_hadjustment(),
+                                      self.scrolled_window.get_vadjustment())
+        self.page_container.add(self.page_canvas)
 
-        self.annotation_widget = AnnotationWidget()
+        self.annotation_widget = self.page_canvas  # annotaties zitten in dezelfde widget
         self.annotation_widget.set_visible(True)
         self.annotation_widget.set_zoom_and_rotation(self.current_zoom, self.current_rotation)
+        self.annotation_widget.simplify_tolerance = self.page_settings.get_stroke_tolerance()
+        self.annotation_widget.smooth_strokes = self.page_settings.get_stroke_smoothing()
         self.annotation_widget.on_annotation_changed = self.save_annotations
-        self.overlay.add_overlay(self.annotation_widget)
 
         self._create_navigation_buttons()
         for btn in [self.btn_left, self.btn_right, self.btn_top, self.btn_bottom]:
             self.main_overlay.add_overlay(btn)
 
-        self.overlay.add_events(Gdk.EventMask.BUTTON_PRESS_MASK | Gdk.EventMask.BUTTON_RELEASE_MASK)
-        self.overlay.connect("button-press-event", self.on_touch_down)
-        self.overlay.connect("button-release-event", self.on_touch_up)
+        self.page_container.add_events(Gdk.EventMask.BUTTON_PRESS_MASK | Gdk.EventMask.BUTTON_RELEASE_MASK)
+        self.page_container.connect("button-press-event", self.on_touch_down)
+        self.page_container.connect("button-release-event", self.on_touch_up)
 
         self.connect("delete-event", self.on_quit)
 
@@ -126,6 +158,13 @@ class PDFViewerUI(Gtk.Window):
             self.page_settings.save()
             print(f"Geselecteerd basis pad voor bladmuziek: {self.muziek_basispad}")
 
+    def _tile_cache_budget(self, screen_width, screen_height):
+        ts = PDFRenderer.TILE_SIZE
+        extra = 1 + 2 * TileLayer.MARGIN_TILES
+        cols = -(-screen_width // ts) + extra
+        rows = -(-screen_height // ts) + extra
+        return cols * rows * ts * ts * 4
+
     def kies_muziek_basispad(self):
         dialog = Gtk.FileChooserDialog(
             title="Selecteer basis map bladmuziek",
@@ -240,20 +279,12 @@ class PDFViewerUI(Gtk.Window):
         self.current_page_in_piece = 0
         self.page_navigator.set_total_pages(self.total_pages_current_pdf)
         self.show_page(self.current_page_in_piece)
-        self.load_annotations()
 
     def _get_pdf_path_for_current_piece(self):
-        bovenliggende_map = os.path.dirname(self.concert_folder)
-        stuk_naam = self.concert_order[self.concert_piece_index]
-        return os.path.join(bovenliggende_map, stuk_naam + ".pdf")
+        return get_pdf_path_for_piece(self.concert_folder, self.concert_order[self.concert_piece_index])
 
     def get_concert_order(self, concert_folder):
-        txt_path = os.path.join(concert_folder, "Concert.txt")
-        if not os.path.isfile(txt_path):
-            return []
-        with open(txt_path, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            return [title.strip() for title in content.split(",") if title.strip()]
+        return get_concert_order(concert_folder)
 
     def load_pdf_direct(self, filepath):
         self.filepath = filepath
@@ -262,7 +293,6 @@ class PDFViewerUI(Gtk.Window):
         self.current_page_in_piece = 0
         self.page_navigator.set_total_pages(self.total_pages_current_pdf)
         self.show_page(self.current_page_in_piece)
-        self.load_annotations()
 
     def next_page(self, button=None):
         if self.concert_order:
@@ -281,7 +311,6 @@ class PDFViewerUI(Gtk.Window):
             self.save_page_settings()
             page = self.page_navigator.next_page()
             self.show_page(page)
-            self.load_annotations()
 
     def prev_page(self, button=None):
         if self.concert_order:
@@ -302,9 +331,9 @@ class PDFViewerUI(Gtk.Window):
             self.save_page_settings()
             page = self.page_navigator.prev_page()
             self.show_page(page)
-            self.load_annotations()
 
     def show_page(self, page_number):
+        scroll_x = scroll_y = 0
         if self.filepath:
             settings = self.page_settings.get(self.filepath, page_number)
             self.current_zoom = settings.get("zoom", 1.0)
@@ -312,61 +341,118 @@ class PDFViewerUI(Gtk.Window):
             scroll_x = settings.get("scroll_x", 0)
             scroll_y = settings.get("scroll_y", 0)
 
-        res = self.pdf_renderer.render_page(
-            page_number,
-            zoom=self.current_zoom,
-            rotation=self.current_rotation
-        )
-        if res:
-            pixbuf, pdf_size = res
-            self.image.set_from_pixbuf(pixbuf)
-
-            if pdf_size:
-                self.annotation_widget.set_pdf_dimensions(pdf_size[0], pdf_size[1])
-
-            while Gtk.events_pending():
-                Gtk.main_iteration()
+        # Een nieuwe opdracht maakt een nog lopende render van een eerdere pagina overbodig
+        if self.current_zoom >= self.TILED_ZOOM:
+            generation = self.render_pipeline.cancel()
+            self.page_loading = False
+            self.annotation_widget.set_zoom_and_rotation(self.current_zoom, self.current_rotation)
+            self.show_page_tiled(page_number)
+            self.load_annotations()
+            self.pending_scroll = (scroll_x, scroll_y)
+            GLib.idle_add(self._restore_scroll, generation)
+            self.schedule_prefetch(page_number)
         else:
-            self.image.clear()
-
+            # Tot de nieuwe surface er is: geen oude pagina met nieuwe annotaties en geen pen-invoer.
+            # Zoom, draaiing en annotaties worden samen met de surface gezet in _on_page_rendered.
+            self.page_loading = True
+            self.page_canvas.clear_page()
+            # Vooruitladen pas als deze pagina klaar is, anders wachten ze op elkaars slot
+            self.pending_scroll = (scroll_x, scroll_y)
+            self.rendering_page = page_number
+            self.show_page_full(page_number)
+
+    def show_page_tiled(self, page_number):
+        pdf_size = self.pdf_renderer.get_page_size(page_number, self.current_zoom, self.current_rotation)
+        if pdf_size:
+            self.page_canvas.set_tiled_page(page_number, self.current_zoom, self.current_rotation, pdf_size)
+        else:
+            self.page_canvas.clear_page()
+
+    def show_page_full(self, page_number):
+        preview_scale = self.PREVIEW_SCALE if self.progressive_rendering else None
+        self.render_pipeline.request(self.filepath, page_number, self.current_zoom, self.current_rotation,
+                                     self._on_page_rendered, preview_scale=preview_scale)
+
+    def _on_page_rendered(self, generation, surface, pdf_size, final):
+        # Alleen aangeroepen voor de laatst aangevraagde pagina, op de hoofdthread
+        if final:
+            self.schedule_prefetch(self.rendering_page)
+        if surface is None:
+            self.page_canvas.clear_page()
+            return
         self.annotation_widget.set_zoom_and_rotation(self.current_zoom, self.current_rotation)
+        self.page_canvas.set_page_surface(surface, pdf_size)
+        if self.page_loading:
+            # Eerste resultaat (voorvertoning of scherp) voor deze pagina
+            self.page_loading = False
+            self.load_annotations()
+        if self.pending_scroll is not None:
+            # Na de layout van de nieuwe afmetingen, anders wordt de scrollpositie afgekapt
+            GLib.idle_add(self._restore_scroll, generation)
+
+    def _restore_scroll(self, generation):
+        if self.render_pipeline.is_current(generation) and self.pending_scroll is not None:
+            scroll_x, scroll_y = self.pending_scroll
+            self.pending_scroll = None
+            self.scrolled_window.get_hadjustment().set_value(scroll_x)
+            self.scrolled_window.get_vadjustment().set_value(scroll_y)
+        return False
 
-        hadjust = self.scrolled_window.get_hadjustment()
-        vadjust = self.scrolled_window.get_vadjustment()
-        hadjust.set_value(scroll_x)
-        vadjust.set_value(scroll_y)
+    def _prefetch_job(self, filepath, page_number):
+        settings = self.page_settings.get(filepath, page_number)
+        return (filepath, page_number, settings.get("zoom", 1.0), settings.get("rotation", 0))
+
+    def schedule_prefetch(self, page_number):
+        if not self.filepath:
+            return
+        jobs = []
+        for buur in (page_number + 1, page_number - 1):
+            if 0 <= buur < self.total_pages_current_pdf:
+                jobs.append(self._prefetch_job(self.filepath, buur))
+        # In concertmodus alvast het volgende stuk openen en de eerste pagina renderen
+        if self.concert_order and self.concert_piece_index < len(self.concert_order) - 1:
+            volgend_stuk = get_pdf_path_for_piece(self.concert_folder, self.concert_order[self.concert_piece_index + 1])
+            if os.path.isfile(volgend_stuk):
+                jobs.append(self._prefetch_job(volgend_stuk, 0))
+        # Pagina's in tegelmodus niet als volledige bitmap voorrenderen
+        jobs = [job for job in jobs if job[2] < self.TILED_ZOOM]
+        self.page_prefetcher.schedule(jobs)
 
     def save_page_settings(self):
         if self.filepath:
-            hadjust = self.scrolled_window.get_hadjustment()
-            vadjust = self.scrolled_window.get_vadjustment()
+            if self.pending_scroll is not None:
+                # Pagina nog niet (of net) getoond: de scrollbalken staan nog op de vorige pagina
+                scroll_x, scroll_y = self.pending_scroll
+            else:
+                scroll_x = self.scrolled_window.get_hadjustment().get_value()
+                scroll_y = self.scrolled_window.get_vadjustment().get_value()
             self.page_settings.set(
                 self.filepath,
                 self.current_page_in_piece if self.concert_order else self.page_navigator.current_page,
                 zoom=self.current_zoom,
                 rotation=self.current_rotation,
-                scroll_x=hadjust.get_value(),
-                scroll_y=vadjust.get_value()
+                scroll_x=scroll_x,
+                scroll_y=scroll_y
             )
-            self.page_settings.save()
+            self.settings_writer.schedule()
 
     def zoom_in(self, button):
         self.current_zoom = min(3.0, self.current_zoom * 1.1)
         self.save_page_settings()
-        self.show_page(self.current_page_in_piece if self.concert_order else self.page_navigator.current_page)
         self.save_annotations()
+        self.show_page(self.current_page_in_piece if self.concert_order else self.page_navigator.current_page)
 
     def zoom_out(self, button):
         self.current_zoom = max(0.1, self.current_zoom / 1.1)
         self.save_page_settings()
-        self.show_page(self.current_page_in_piece if self.concert_order else self.page_navigator.current_page)
         self.save_annotations()
+        self.show_page(self.current_page_in_piece if self.concert_order else self.page_navigator.current_page)
 
     def rotate(self, button):
         self.current_rotation = (self.current_rotation + 90) % 360
         self.save_page_settings()
-        self.show_page(self.current_page_in_piece if self.concert_order else self.page_navigator.current_page)
         self.save_annotations()
+        self.show_page(self.current_page_in_piece if self.concert_order else self.page_navigator.current_page)
 
     def toggle_pencil(self, btn):
         active = btn.get_active()
@@ -459,26 +545,57 @@ class PDFViewerUI(Gtk.Window):
         self.annotation_widget.load_annotations(annotations)
 
     def save_annotations(self):
-        if not self.filepath:
+        # Tijdens het laden is het canvas leeg; dat mag de opgeslagen annotaties niet overschrijven
+        if not self.filepath or self.page_loading:
             return
         annotations = self.annotation_widget.get_serializable_annotations()
         self.annotation_storage.set(self.filepath, self.current_page_in_piece if self.concert_order else self.page_navigator.current_page, annotations)
-        self.annotation_storage.save()
+        self.annotation_writer.schedule()
 
     def save_and_quit(self, button=None):
         self.save_page_settings()
         self.save_annotations()
+        self.settings_writer.flush()
+        self.annotation_writer.flush()
+        self.fingerprint_writer.flush()
+        self.page_prefetcher.stop()
+        self.render_pipeline.stop()
+        self.print_render_stats()
         Gtk.main_quit()
 
     def on_quit(self, *args):
         self.save_page_settings()
         self.save_annotations()
+        self.settings_writer.flush()
+        self.annotation_writer.flush()
+        self.fingerprint_writer.flush()
+        self.page_prefetcher.stop()
+        self.render_pipeline.stop()
+        self.print_render_stats()
         Gtk.main_quit()
 
+    def print_render_stats(self):
+        stats = self.pdf_renderer.render_cache.stats()
+        print(f"Render cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['evictions']} verwijderd, {stats['bytes'] / 1048576:.1f}/"
+              f"{stats['max_bytes'] / 1048576:.1f} MB in gebruik")
+        if self.pdf_renderer.disk_cache is not None:
+            disk = self.pdf_renderer.disk_cache
+            print(f"Schijfcache: {disk.hits} hits, {disk.misses} misses, {disk.evictions} verwijderd")
+        print(f"Gedraaid vanuit cache: {self.pdf_renderer.rotations_derived} keer")
+        pipeline = self.render_pipeline.stats()
+        print(f"Render-opdrachten: {pipeline['requests']}, {pipeline['cancelled']} geannuleerd, "
+              f"{pipeline['superseded']} ingehaald")
+        pool = self.pdf_renderer.document_pool.stats()
+        print(f"Documentpool: {pool['hits']} hergebruikt, {pool['misses']} geopend, "
+              f"{pool['load_time']:.2f} s parsen, {pool['time_saved']:.2f} s bespaard")
+        self.annotation_widget.report_stroke_stats()
+        self.annotation_widget.report_frame_stats()
+
     def on_touch_down(self, widget, event):
         if not self.filepath:
             return False
-        alloc = self.image.get_allocation()
+        alloc = self.page_canvas.get_allocation()
         x, y = event.x, event.y
 
         if alloc.width * 0.4 < x < alloc.width * 0.6 and alloc.height * 0.4 < y < alloc.height * 0.6:
@@ -492,7 +609,7 @@ class PDFViewerUI(Gtk.Window):
         if not self.filepath:
             return False
 
-        alloc = self.overlay.get_allocation()
+        alloc = self.page_container.get_allocation()
         x, y = event.x, event.y
 
         zone_size_x = alloc.width * 0.15
@@ -0,0 +1,117 @@
+#warmup.py
+# Rendert voor een optreden alle pagina's van alle stukken uit Concert.txt vooraf
+# in de schijfcache, zodat de viewer ze direct kan laden.
+#
+#   python warmup.py <orkestmap of orkestnaam> [--workers N]
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from concert_list_manager import get_concert_order, get_pdf_path_for_piece
+from disk_cache import DiskPageCache
+from storage import open_storage
+from pdf_renderer import PDFRenderer
+
+
+def render_pages(filepath, pages, cache_dir):
+    # Draait in een apart proces; elke worker heeft een eigen Poppler-document.
+    # Geen limiet tijdens het vullen, het hoofdproces ruimt op het eind op.
+    disk_cache = DiskPageCache(cache_dir, max_bytes=float("inf"))
+    # Zelfde uitvoer als de viewer (PageCanvas), anders passen de sleutels in de schijfcache niet
+    renderer = PDFRenderer(cache_bytes=0, disk_cache=disk_cache, output_surfaces=True)
+    renderer.open_pdf(filepath)
+    rendered = 0
+    for page_number, zoom, rotation in pages:
+        if renderer.render_page(page_number, zoom=zoom, rotation=rotation):
+            rendered += 1
+    return rendered
+
+
+def page_count(filepath):
+    renderer = PDFRenderer(cache_bytes=0)
+    renderer.open_pdf(filepath)
+    return renderer.get_page_count()
+
+
+def resolve_concert(orkest, page_settings):
+    if not os.path.isdir(orkest):
+        basispad = page_settings.get_basispad()
+        if basispad:
+            orkest = os.path.join(basispad, orkest)
+    concert_folder = os.path.join(os.path.abspath(orkest), "Concert")
+    return [get_pdf_path_for_piece(concert_folder, stuk) for stuk in get_concert_order(concert_folder)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render alle concertpagina's vooraf in de schijfcache")
+    parser.add_argument("orkest", help="orkestmap, of de naam van een orkest in de basismap")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="aantal processen (standaard: alle cores)")
+    args = parser.parse_args()
+
+    page_settings, _ = open_storage()
+    disk_cache_mb = page_settings.get_disk_cache_mb()
+    if disk_cache_mb <= 0:
+        print("Schijfcache staat uit (_app_disk_cache_mb_ = 0), niets te doen.")
+        return
+    cache = DiskPageCache(max_bytes=int(disk_cache_mb * 1024 * 1024))
+
+    pdfs = resolve_concert(args.orkest, page_settings)
+    if not pdfs:
+        print(f"Geen Concert/Concert.txt gevonden voor {args.orkest}")
+        return
+    missing = [pdf for pdf in pdfs if not os.path.isfile(pdf)]
+    present = list(dict.fromkeys(pdf for pdf in pdfs if os.path.isfile(pdf)))
+
+    start = time.perf_counter()
+    total_pages = 0
+    # spawn: Poppler/GLib en fork gaan niet goed samen
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        # Per bestand, zodat één onleesbare PDF (GLib.Error in de worker) de rest niet tegenhoudt
+        count_futures = {pool.submit(page_count, pdf): pdf for pdf in present}
+        counts = {}
+        unreadable = []
+        for future in as_completed(count_futures):
+            pdf = count_futures[future]
+            try:
+                counts[pdf] = future.result()
+            except Exception as e:
+                print(f"Kan {pdf} niet openen: {e}")
+                unreadable.append(pdf)
+        futures = []
+        for pdf in [pdf for pdf in present if pdf in counts]:
+            pages = []
+            for page_number in range(counts[pdf]):
+                settings = page_settings.get(pdf, page_number)
+                zoom = settings.get("zoom", 1.0)
+                # Pagina's die de viewer in tegels toont hebben geen volledige bitmap nodig
+                if zoom < PDFRenderer.TILED_ZOOM:
+                    pages.append((page_number, zoom, settings.get("rotation", 0)))
+            # Elk document over alle workers verdelen, ook als het concert uit weinig stukken bestaat
+            for offset in range(min(args.workers, len(pages))):
+                futures.append(pool.submit(render_pages, pdf, pages[offset::args.workers], cache.directory))
+        for future in as_completed(futures):
+            try:
+                total_pages += future.result()
+            except Exception as e:
+                print(f"Fout bij renderen: {e}")
+    duur = time.perf_counter() - start
+
+    cache.evict()
+    page_settings.identity.save()  # vingerafdrukken die resolve() onderweg heeft toegevoegd
+    print(f"{total_pages} pagina's uit {len(counts)} stukken gerenderd in {duur:.1f} s "
+          f"({total_pages / duur if duur > 0 else 0:.1f} pagina's/s, {args.workers} processen)")
+    print(f"Schijfcache: {cache.total_bytes / 1048576:.1f} MB van {disk_cache_mb} MB")
+    if cache.evictions:
+        print(f"Let op: {cache.evictions} pagina's pasten niet in de schijfcache; verhoog _app_disk_cache_mb_")
+    for pdf in missing:
+        print(f"PDF bestand niet gevonden: {pdf}")
+    for pdf in unreadable:
+        print(f"PDF bestand overgeslagen (onleesbaar): {pdf}")
+
+
+if __name__ == "__main__":
+    main()
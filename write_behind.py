@@ -0,0 +1,46 @@
+#write_behind.py
+import threading
+
+
+class WriteBehind:
+    # Bundelt een reeks wijzigingen tot één save() op een achtergrondthread.
+    # De opslag zelf houdt bij of er iets veranderd is; een save() zonder
+    # wijzigingen doet niets.
+    def __init__(self, storage, delay=2.0, name="write-behind"):
+        self.storage = storage
+        self.delay = delay
+        self.name = name
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # nooit twee save()s tegelijk
+        self.timer = None
+        self.writes = 0
+
+    def schedule(self):
+        with self.lock:
+            if self.timer is not None:
+                return  # er staat al een schrijfactie klaar, die neemt deze wijziging mee
+            self.timer = threading.Timer(self.delay, self._write)
+            self.timer.name = self.name
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _write(self):
+        with self.lock:
+            self.timer = None
+        self._save()
+
+    def _save(self):
+        with self.write_lock:
+            try:
+                self.storage.save()
+                self.writes += 1
+            except Exception as e:
+                print(f"Error in background save ({self.name}): {e}")
+
+    def flush(self):
+        # Synchroon wegschrijven, bijv. bij afsluiten
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        self._save()